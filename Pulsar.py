@@ -1,25 +1,25 @@
+import time
+STARTUP_T0 = time.perf_counter() # Before anything heavy is imported, for the startup report
 import customtkinter as ctk
 from tkinter import messagebox, filedialog, ttk
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.colors import ListedColormap, BoundaryNorm
-from matplotlib.collections import LineCollection
 import pandas as pd
 import numpy as np
 import os
 import sys
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
 import webbrowser
-from PIL import Image
-import re 
-import math
+import threading
+import queue
+import pulsar_perf as perf
+from pulsar_engine import (Ledger, LedgerReadError, BalanceIndex, ProjectionCancelled, compute_projection, clean_amount, default_data_folder,
+                           forecast_summary, range_to_years, insert_static_row, remove_static_rows, to_datetime64,
+                           EMPTY_DATES, FORECAST_RANGES, projection_cache)
+from pulsar_import import prepare_import
+from pulsar_export import export_forecast
+from pulsar_search import HistorySearch
+# matplotlib (graph) and PIL (About dialog) are imported where they are first needed, after the window is up
 
 # --- Configuration ---
-DATA_FOLDER = '💲NovaFoundry'
-TRANS_FILE = 'transactions.csv'
-RECUR_FILE = 'recurring_rules.csv'
 ICON_PATH = "Icons/Pulsar_Icon.ico"
 VERSION = "1.2.1"
 APP_NAME = "Pulsar"
@@ -33,154 +33,152 @@ CURRENT_CURRENCY = "$"
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
+# Lists
+TREE_ROW_HEIGHT = 25
+
 # Font Setup
 FONT_REGULAR_FAMILY = "Be Vietnam Pro"
 FONT_BOLD_FAMILY = "Be Vietnam Pro Bold"
 
 # Get Paths
-app_data = os.environ.get('LOCALAPPDATA')
-if app_data is None: exit(1)
-folder = os.path.join(app_data, DATA_FOLDER)
-os.makedirs(folder, exist_ok=True)
-trans_path = os.path.join(folder, TRANS_FILE)
-recur_path = os.path.join(folder, RECUR_FILE)
+folder = default_data_folder()
+
+# --- Startup Timing ---
+
+# Set PULSAR_STARTUP_REPORT=1 to print the report, or to a file path to append it there
+STARTUP_REPORT = os.environ.get('PULSAR_STARTUP_REPORT')
+STARTUP_DONE = {'forecast shown', 'graph drawn'}
+startup_marks = {} # stage -> seconds since launch, in the order reached
+
+def startup_mark(stage):
+    if stage in startup_marks or STARTUP_DONE <= startup_marks.keys(): return
+    startup_marks[stage] = time.perf_counter() - STARTUP_T0
+    if STARTUP_DONE <= startup_marks.keys(): report_startup()
+
+def report_startup():
+    if not STARTUP_REPORT: return
+    lines = [f"{APP_NAME} {VERSION} startup: {max(startup_marks.values()) * 1000:.0f} ms"]
+    prev = 0.0
+    for stage, t in startup_marks.items():
+        lines.append(f"  {stage:<16}{t * 1000:8.1f} ms  (+{(t - prev) * 1000:.1f})")
+        prev = t
+    report = "\n".join(lines) + "\n"
+    try:
+        if STARTUP_REPORT.lower() in ('1', 'true', 'yes'):
+            if sys.stdout: sys.stdout.write(report)
+        else:
+            with open(STARTUP_REPORT, 'a', encoding='utf-8') as f: f.write(report)
+    except: pass
 
-# --- Data Management ---
+def on_first_paint():
+    startup_mark('first paint')
+    build_graph()
 
-def init_files():
-    if not os.path.exists(trans_path):
-        pd.DataFrame(columns=['Date', 'Description', 'Amount', 'Type']).to_csv(trans_path, index=False)
-    
-    if not os.path.exists(recur_path):
-        pd.DataFrame(columns=['StartDate', 'Description', 'Amount', 'Interval', 'Unit', 'EndDate']).to_csv(recur_path, index=False)
+startup_mark('imports')
 
-init_files()
+# --- Data Management ---
+
+try:
+    ledger = Ledger(folder)
+    ledger.load()
+except LedgerReadError as e:
+    # Better to stop here than start on an empty ledger, which the first save would write over the real one
+    messagebox.showerror("Pulsar", f"Your data couldn't be loaded, so Pulsar won't start rather than risk overwriting it.\n\n{e}")
+    sys.exit(1)
+store = ledger.store
 
 df_static = pd.DataFrame()
 df_rules = pd.DataFrame()
 df_display = pd.DataFrame() 
+balance_index = BalanceIndex.from_projection(df_display) # Date/balance lookups over df_display
+display_version = 0 # Bumped whenever df_display is rebuilt
+display_patch = None # (version the graph last drew, earliest changed date) while df_display has only been patched since
+display_rules = None # Rule id of each recurring row of df_display, in order (patching history never moves them)
+snapshot_pending = False # df_display was patched since it was last saved to the projection cache
 
 def load_data():
     global df_static, df_rules
-    try:
-        df_static = pd.read_csv(trans_path)
-        df_static['Date'] = pd.to_datetime(df_static['Date'])
-    except:
-        df_static = pd.DataFrame(columns=['Date', 'Description', 'Amount', 'Type'])
-
-    try:
-        df_rules = pd.read_csv(recur_path)
-        df_rules['StartDate'] = pd.to_datetime(df_rules['StartDate'])
-        if 'EndDate' not in df_rules.columns:
-            df_rules['EndDate'] = pd.NaT
-        else:
-            df_rules['EndDate'] = pd.to_datetime(df_rules['EndDate'])
-    except:
-        df_rules = pd.DataFrame(columns=['StartDate', 'Description', 'Amount', 'Interval', 'Unit', 'EndDate'])
-
-def add_interval(start_date, interval, unit):
-    """
-    Helper to add an interval (float supported) to a date.
-    Converts non-integer units to days if necessary.
-    """
-    try:
-        val = float(interval)
-    except:
-        val = 1.0
+    df_static, df_rules = store.load()
+
+def set_projection(projection, index=None, rule_ids=None):
+    global df_display, balance_index, display_version, display_patch, display_rules, snapshot_pending
+    df_display = projection
+    balance_index = index if index is not None else BalanceIndex.from_projection(projection)
+    display_version += 1
+    display_patch = None
+    display_rules = None if rule_ids is None else np.asarray(rule_ids[rule_ids >= 0])
+    snapshot_pending = False
+
+def patch_projection(result):
+    """Applies a (projection, index, changed_from) from insert_static_row / remove_static_rows."""
+    global df_display, balance_index, display_version, display_patch, snapshot_pending
+    projection, index, changed_from = result
+    index.carry_rollups(balance_index, changed_from) # Only the buckets from the change on are redone
+    if display_patch is None: display_patch = (display_version, changed_from)
+    else: display_patch = (display_patch[0], min(display_patch[1], changed_from))
+    df_display = projection
+    balance_index = index
+    display_version += 1
+    snapshot_pending = True
+
+def save_snapshot():
+    """Saves a patched forecast to the projection cache (on the way out), so the next launch can start from it."""
+    if not snapshot_pending or display_rules is None or projection_stale(): return
+    rule_ids = np.full(len(df_display), -1, dtype=np.int32)
+    rule_ids[df_display.forecast.recurring] = display_rules
+    ledger.snapshot.save(ledger.snapshot.key(forecast_years()), df_display, rule_ids)
+
+def projection_stale():
+    """True while a full rebuild is queued or running, so patching df_display would be pointless."""
+    return projection_worker.busy or 'data' in scheduler.dirty
 
-    # If it's a clean integer, keep using standard logic for accuracy (especially months/years)
-    is_int = (val % 1 == 0)
-    
-    if unit == 'Days':
-        return start_date + timedelta(days=val)
-    elif unit == 'Weeks':
-        return start_date + timedelta(weeks=val)
-    elif unit == 'Months':
-        if is_int:
-            return start_date + relativedelta(months=int(val))
-        else:
-            # 0.5 months -> ~15.2 days
-            days = val * 30.437 
-            return start_date + timedelta(days=days)
-    elif unit == 'Years':
-        if is_int:
-            return start_date + relativedelta(years=int(val))
-        else:
-            days = val * 365.25
-            return start_date + timedelta(days=days)
-    return start_date
+# --- File Operations ---
 
-def generate_projection(years=1.0):
-    global df_display
+def save_static(date, desc, amount):
+    ledger.save_static(date, desc, amount)
+
+def add_static(date, desc, amount):
+    # Patches the row into the forecast on screen; a full refresh if that forecast is out of date
+    global history_source
+    reloads = store.reloads
+    save_static(date, desc, amount)
+    result = None
+    if not projection_stale() and store.reloads == reloads:
+        result = insert_static_row(df_display, date, desc, amount)
+    if result is None:
+        refresh_data(); return
+
+    load_data() # Already in memory, nothing is read
+    patch_projection(result)
+    history_order.add(df_static['Date'].iat[-1])
+    history_search.add(df_static['Date'].iat[-1], df_static['Description'].iat[-1], df_static['Amount'].iat[-1])
+    history_source = df_static
+    scheduler.request('lists', 'prediction', 'view')
+
+def delete_static_rows(indices):
+    """Deletes history rows by index, patching them out of the forecast like add_static does."""
+    global history_source
+    reloads = store.reloads
     load_data()
-    
-    generated_rows = []
-    end_date = datetime.now() + timedelta(days=365 * years)
-    
-    if not df_rules.empty:
-        for _, rule in df_rules.iterrows():
-            current_date = rule['StartDate']
-            rule_end = rule['EndDate'] if pd.notnull(rule['EndDate']) else end_date + timedelta(days=1)
-            cutoff_date = min(end_date, rule_end)
-            
-            while current_date <= cutoff_date:
-                generated_rows.append({
-                    'Date': current_date,
-                    'Description': rule['Description'],
-                    'Amount': rule['Amount'],
-                    'Recurring': True
-                })
-                
-                # Use the new helper function
-                current_date = add_interval(current_date, rule['Interval'], rule['Unit'])
-
-    frames_to_concat = []
-    if not df_static.empty:
-        temp_static = df_static.copy()
-        temp_static['Recurring'] = False
-        frames_to_concat.append(temp_static)
-        
-    if generated_rows:
-        frames_to_concat.append(pd.DataFrame(generated_rows))
-        
-    if frames_to_concat:
-        df_display = pd.concat(frames_to_concat, ignore_index=True)
-        df_display = df_display.sort_values('Date').reset_index(drop=True)
-        df_display['Balance'] = df_display['Amount'].cumsum()
-    else:
-        df_display = pd.DataFrame(columns=['Date', 'Description', 'Amount', 'Balance', 'Recurring'])
+    valid = [i for i in indices if i in df_static.index]
+    rows = df_static.loc[valid]
+    if not store.delete_static(valid): return
 
-# --- File Operations ---
+    result = None
+    if not projection_stale() and store.reloads == reloads:
+        result = remove_static_rows(df_display, rows)
+    if result is None:
+        refresh_data(); return
 
-def save_static(date, desc, amount):
-    new_row = pd.DataFrame([{'Date': date, 'Description': desc, 'Amount': amount, 'Type': 'Static'}])
-    if os.path.exists(trans_path) and os.path.getsize(trans_path) > 0:
-        new_row.to_csv(trans_path, mode='a', header=False, index=False)
-    else:
-        new_row.to_csv(trans_path, index=False)
+    load_data()
+    patch_projection(result)
+    history_order.remove(valid)
+    history_search.remove(valid)
+    history_source = df_static
+    scheduler.request('lists', 'prediction', 'view')
 
 def save_rule(start_date, desc, amount, interval, unit, end_date=None, index_to_overwrite=None):
-    global df_rules
-    new_data = {
-        'StartDate': start_date, 
-        'Description': desc, 
-        'Amount': amount, 
-        'Interval': float(interval), # Ensure stored as float/number
-        'Unit': unit,
-        'EndDate': end_date
-    }
-    
-    if index_to_overwrite is not None:
-        load_data()
-        if 0 <= index_to_overwrite < len(df_rules):
-            df_rules.loc[index_to_overwrite] = new_data
-            df_rules.to_csv(recur_path, index=False)
-    else:
-        new_row = pd.DataFrame([new_data])
-        if os.path.exists(recur_path) and os.path.getsize(recur_path) > 0:
-            new_row.to_csv(recur_path, mode='a', header=False, index=False)
-        else:
-            new_row.to_csv(recur_path, index=False)
+    ledger.save_rule(start_date, desc, amount, interval, unit, end_date=end_date, index_to_overwrite=index_to_overwrite)
 
 def delete_rule():
     sel = tree_recur.selection()
@@ -189,30 +187,11 @@ def delete_rule():
         return
     
     if messagebox.askyesno("Confirm Delete", "Are you sure? Past occurrences will be saved to history."):
-        idx = tree_recur.index(sel[0])
-        load_data()
-        
-        rule = df_rules.iloc[idx]
-        current_date = rule['StartDate']
-        now = datetime.now()
-        
-        rule_end = rule['EndDate'] if pd.notnull(rule['EndDate']) else now + timedelta(days=1)
-        archive_limit = min(now, rule_end)
-        
-        while current_date <= archive_limit:
-            save_static(current_date, f"{rule['Description']} (Archived)", rule['Amount'])
-            current_date = add_interval(current_date, rule['Interval'], rule['Unit'])
-
-        df_rules.drop(df_rules.index[idx], inplace=True)
-        df_rules.to_csv(recur_path, index=False)
+        ledger.archive_rule(tree_recur.index(sel[0]))
         refresh_data()
 
 # --- Helper Functions ---
 
-def clean_amount(amount_str):
-    clean = re.sub(r'[^\d.-]', '', amount_str)
-    return float(clean)
-
 def apply_icon(window):
     if ICON_PATH and os.path.exists(ICON_PATH):
         try:
@@ -220,6 +199,110 @@ def apply_icon(window):
         except:
             pass
 
+# --- List Views ---
+
+class TreeSync:
+    """Shows a list of (iid, values) rows, touching only the items that changed since the last call."""
+    def __init__(self, tree):
+        self.tree = tree
+        self.values = {} # iid -> values currently shown, in display order
+
+    def show(self, rows):
+        tree = self.tree
+        wanted = dict(rows)
+        stale = [iid for iid in self.values if iid not in wanted]
+        if stale: tree.delete(*stale)
+
+        kept_before = [iid for iid in self.values if iid in wanted]
+        kept_after = [iid for iid in wanted if iid in self.values]
+        if kept_before != kept_after:
+            for pos, iid in enumerate(kept_after): tree.move(iid, '', pos)
+
+        # With the surviving rows in order, inserting at the final position lands every new row correctly
+        for pos, (iid, values) in enumerate(wanted.items()):
+            if iid not in self.values: tree.insert('', pos, iid=iid, values=values)
+            elif self.values[iid] != values: tree.item(iid, values=values)
+        self.values = wanted
+
+class HistoryOrder:
+    """Newest-first order of the history rows (df_static positions); adds and removes go in without a re-sort."""
+    def __init__(self):
+        self.asc = np.arange(0)
+        self.sorted_dates = EMPTY_DATES
+
+    def rebuild(self, dates):
+        self.asc = np.argsort(dates, kind='stable')
+        self.sorted_dates = dates[self.asc]
+
+    def add(self, date):
+        """A row appended to the end of df_static."""
+        date = to_datetime64(date)
+        # Highest position, so it goes after any rows on the same date, like the stable sort would put it
+        pos = np.searchsorted(self.sorted_dates, date, side='right')
+        self.asc = np.insert(self.asc, pos, len(self.asc))
+        self.sorted_dates = np.insert(self.sorted_dates, pos, date)
+
+    def remove(self, positions):
+        """Rows dropped from df_static, which is then renumbered from 0."""
+        positions = np.sort(np.asarray(positions, dtype=np.int64))
+        keep = ~np.isin(self.asc, positions)
+        self.asc = self.asc[keep]
+        self.sorted_dates = self.sorted_dates[keep]
+        self.asc -= np.searchsorted(positions, self.asc)
+
+    @property
+    def keys(self):
+        return self.asc[::-1]
+
+class VirtualList:
+    """Treeview holding only the rows in view; scrolling picks a new window of keys (iids) and formats just those."""
+    def __init__(self, tree, scrollbar, row_height):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_height = row_height
+        self.sync = TreeSync(tree)
+        self.keys = np.arange(0)
+        self.format_row = None
+        self.first = 0
+
+        scrollbar.configure(command=self.on_scroll)
+        tree.bind('<MouseWheel>', lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        tree.bind('<Button-4>', lambda e: self.scroll_by(-3))
+        tree.bind('<Button-5>', lambda e: self.scroll_by(3))
+        tree.bind('<Configure>', lambda e: self.render())
+
+    def visible_rows(self):
+        # One row's worth of height goes to the headings
+        return max(1, self.tree.winfo_height() // self.row_height - 1)
+
+    def set_keys(self, keys, format_row, top=False):
+        self.keys = keys
+        self.format_row = format_row
+        if top: self.first = 0
+        self.render()
+
+    def scroll_by(self, rows):
+        self.first += rows
+        self.render()
+        return 'break' # Don't let the Treeview scroll its own (tiny) item list
+
+    def on_scroll(self, *args):
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * len(self.keys))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.first += step * self.visible_rows() if args[2] == 'pages' else step
+        self.render()
+
+    def render(self):
+        total = len(self.keys)
+        visible = self.visible_rows()
+        self.first = max(0, min(self.first, total - visible))
+        window = self.keys[self.first:self.first + visible]
+        self.sync.show([(str(k), self.format_row(k)) for k in window])
+        if total: self.scrollbar.set(self.first / total, min(1.0, (self.first + visible) / total))
+        else: self.scrollbar.set(0.0, 1.0)
+
 # --- Popups ---
 
 def open_about():
@@ -231,6 +314,7 @@ def open_about():
     
     if os.path.exists(ICON_PATH):
         try:
+            from PIL import Image # Only the About dialog needs it
             my_image = ctk.CTkImage(light_image=Image.open(ICON_PATH), 
                                     dark_image=Image.open(ICON_PATH), 
                                     size=(100, 100))
@@ -365,10 +449,10 @@ def open_transaction_dialog(is_income=True, edit_rule_idx=None):
                     except: raise ValueError("Invalid End Date format.")
 
                 save_rule(full_date, desc, final_amt, interval, unit, end_date=end_dt_val, index_to_overwrite=edit_rule_idx)
+                refresh_data()
             else:
-                save_static(full_date, desc, final_amt)
+                add_static(full_date, desc, final_amt)
             
-            refresh_data()
             dialog.destroy()
         except ValueError as ve: messagebox.showwarning("Input Error", str(ve))
         except Exception as e: messagebox.showerror("System Error", str(e))
@@ -388,13 +472,108 @@ def edit_selected_rule():
 def reset_data():
     if messagebox.askyesno("Confirm Reset", "This will delete ALL your data including transactions and recurring items. Are you sure?"):
         try:
-            if os.path.exists(trans_path): os.remove(trans_path)
-            if os.path.exists(recur_path): os.remove(recur_path)
-            init_files()
+            store.reset()
             refresh_data()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to reset data: {str(e)}")
 
+def export_data():
+    path = filedialog.asksaveasfilename(title="Export Data", defaultextension=".csv",
+                                        filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx"), ("OpenDocument", "*.ods")])
+    if not path: return
+    try:
+        load_data()
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ('.xlsx', '.ods'):
+            engine = 'openpyxl' if ext == '.xlsx' else 'odf'
+            with pd.ExcelWriter(path, engine=engine) as writer:
+                df_static.to_excel(writer, sheet_name='Transactions', index=False)
+                df_rules.to_excel(writer, sheet_name='Recurring', index=False)
+        else:
+            # Same layout as the original transactions.csv / recurring_rules.csv
+            df_static.to_csv(path, index=False)
+            df_rules.to_csv(os.path.splitext(path)[0] + '_recurring.csv', index=False)
+        messagebox.showinfo("Export Complete", f"Data exported to {path}")
+    except Exception as e:
+        messagebox.showerror("Error", f"Failed to export: {e}")
+
+def import_statement():
+    # Parsing and duplicate checks run on a background thread; the rows are saved from the Tk thread
+    path = filedialog.askopenfilename(title="Import Bank Statement",
+                                      filetypes=[("Bank statements", "*.csv *.ofx *.qfx"), ("All files", "*.*")])
+    if not path: return
+    load_data()
+    updates = queue.Queue()
+
+    def run(static):
+        try: updates.put(('done', prepare_import(path, static, progress=lambda stats: updates.put(('progress', stats)))))
+        except Exception as e: updates.put(('error', e))
+
+    def finish(rows, stats):
+        try:
+            ledger.save_static_rows(rows['Date'], rows['Description'], rows['Amount'])
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save imported transactions: {e}")
+            scheduler.request('prediction') # Put the forecast text back over the import progress
+            return
+        refresh_data()
+        messagebox.showinfo("Import Complete",
+            f"Imported {stats['imported']:,} transactions from {os.path.basename(path)}.\n"
+            f"Skipped {stats['duplicates']:,} already in your history and {stats['skipped']:,} unreadable rows.\n\n"
+            f"{stats['rows_read']:,} rows in {stats['seconds']:.1f}s ({stats['rows_per_sec']:,.0f} rows/sec)")
+
+    def poll():
+        while True:
+            try: kind, payload = updates.get_nowait()
+            except queue.Empty: break
+            if kind == 'progress':
+                lbl_pred_sub.configure(text=f"Importing {os.path.basename(path)}: {payload['rows_read']:,} rows read")
+            elif kind == 'error':
+                scheduler.request('prediction')
+                messagebox.showerror("Error", f"Failed to import: {payload}"); return
+            else:
+                finish(*payload); return
+        root.after(POLL_MS, poll)
+
+    threading.Thread(target=run, args=(df_static,), daemon=True).start()
+    lbl_pred_sub.configure(text=f"Importing {os.path.basename(path)}...")
+    root.after(POLL_MS, poll)
+
+def export_forecast_data():
+    """Streams the whole forecast for the current range to a file on a background thread."""
+    path = filedialog.asksaveasfilename(title="Export Forecast", defaultextension=".csv",
+                                        filetypes=[("CSV", "*.csv"), ("Parquet", "*.parquet")])
+    if not path: return
+    load_data()
+    p_text, years = proj_var.get(), forecast_years()
+    updates = queue.Queue()
+
+    def run(static, rules):
+        try:
+            start = time.perf_counter()
+            rows = export_forecast(static, rules, years, path, progress=lambda rows: updates.put(('progress', rows)))
+            updates.put(('done', (rows, time.perf_counter() - start)))
+        except Exception as e: updates.put(('error', e))
+
+    def poll():
+        while True:
+            try: kind, payload = updates.get_nowait()
+            except queue.Empty: break
+            if kind == 'progress':
+                lbl_pred_sub.configure(text=f"Exporting forecast: {payload:,} rows written")
+            else:
+                scheduler.request('prediction')
+                if kind == 'error': messagebox.showerror("Error", f"Failed to export forecast: {payload}")
+                else:
+                    rows, seconds = payload
+                    messagebox.showinfo("Export Complete", f"Exported the {p_text} forecast ({rows:,} rows) to {path} in {seconds:.1f}s")
+                return
+        root.after(POLL_MS, poll)
+
+    threading.Thread(target=run, args=(df_static, df_rules), daemon=True).start()
+    lbl_pred_sub.configure(text="Exporting forecast...")
+    root.after(POLL_MS, poll)
+
 # --- Main App ---
 
 root = ctk.CTk()
@@ -403,8 +582,9 @@ root.configure(fg_color='#1a1a1a')
 apply_icon(root)
 
 def on_closing():
+    try: save_snapshot()
+    except: pass
     try:
-        plt.close('all') 
         root.quit()      
         root.destroy()   
     except: pass
@@ -419,17 +599,11 @@ def delete_selected_history():
     
     if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete the selected history item(s)?"):
         try:
-            load_data()
             # The 'iid' of the treeview items corresponds to the DataFrame index
             indices_to_delete = [int(item) for item in sel]
             
-            # Filter out invalid indices just in case
-            valid_indices = [i for i in indices_to_delete if i in df_static.index]
-            
-            if valid_indices:
-                df_static.drop(valid_indices, inplace=True)
-                df_static.to_csv(trans_path, index=False)
-                refresh_data()
+            # Invalid indices are filtered out
+            delete_static_rows(indices_to_delete)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to delete: {e}")
 # --- FIX END ---
@@ -453,22 +627,32 @@ ctk.CTkButton(ctrl_frame, text="+ Add Spending", command=lambda: open_transactio
 
 ctk.CTkButton(ctrl_frame, text="Reset Data", command=reset_data, fg_color="#ff9900", hover_color="#cc7a00", corner_radius=20, width=120, font=font_bold).pack(side='left', padx=10, pady=10)
 
+ctk.CTkButton(ctrl_frame, text="Import", command=import_statement, fg_color="transparent", border_width=1,
+              text_color="#aaaaaa", corner_radius=20, width=80).pack(side='left', padx=(10, 0), pady=10)
+
+ctk.CTkButton(ctrl_frame, text="Export", command=export_data, fg_color="transparent", border_width=1,
+              text_color="#aaaaaa", corner_radius=20, width=80).pack(side='left', padx=(10, 0), pady=10)
+
+ctk.CTkButton(ctrl_frame, text="Export Forecast", command=export_forecast_data, fg_color="transparent", border_width=1,
+              text_color="#aaaaaa", corner_radius=20, width=110).pack(side='left', padx=10, pady=10)
+
 # Settings
 ctk.CTkLabel(ctrl_frame, text="Currency:", font=font_bold).pack(side='left', padx=(30, 5))
 curr_var = ctk.StringVar(value="$")
 def change_currency(val):
     global CURRENT_CURRENCY
     CURRENT_CURRENCY = val
-    refresh_data()
+    # Amounts don't change, so the projection is left alone
+    scheduler.request('lists', 'prediction', 'view')
 ctk.CTkComboBox(ctrl_frame, values=CURRENCIES, variable=curr_var, command=change_currency, width=60).pack(side='left')
 
 ctk.CTkLabel(ctrl_frame, text="Forecast Range:", font=font_bold).pack(side='left', padx=(20, 5))
 proj_var = ctk.StringVar(value="1 Year")
-ctk.CTkComboBox(ctrl_frame, values=["3 Months", "6 Months", "1 Year", "2 Years", "5 Years", "10 Years"], variable=proj_var, command=lambda x: refresh_data(), width=110).pack(side='left')
+ctk.CTkComboBox(ctrl_frame, values=FORECAST_RANGES, variable=proj_var, command=lambda x: refresh_data(), width=110).pack(side='left')
 
 ctk.CTkLabel(ctrl_frame, text="Zoom Level:", font=font_bold).pack(side='left', padx=(20, 5))
 scale_var = ctk.StringVar(value="1 Year")
-ctk.CTkComboBox(ctrl_frame, values=["1 Month", "6 Months", "1 Year", "2 Years", "All Time"], variable=scale_var, command=lambda x: update_graph(), width=110).pack(side='left')
+ctk.CTkComboBox(ctrl_frame, values=["1 Month", "6 Months", "1 Year", "2 Years", "All Time"], variable=scale_var, command=lambda x: scheduler.request('view'), width=110).pack(side='left')
 
 ctk.CTkButton(ctrl_frame, text="About", command=open_about, fg_color="transparent", border_width=1, 
               text_color="#aaaaaa", corner_radius=20, width=80).pack(side='right', padx=10)
@@ -494,19 +678,48 @@ content.rowconfigure(1, weight=1)
 # Left: History
 f_left = ctk.CTkFrame(content, corner_radius=15, border_color="#3a3a3a", border_width=1)
 f_left.grid(row=1, column=0, sticky='nsew', padx=(0,5))
-f_left.rowconfigure(1, weight=1)
+f_left.rowconfigure(2, weight=1)
 f_left.columnconfigure(0, weight=1)
 
-ctk.CTkLabel(f_left, text="History (One-Time Only)", font=(FONT_BOLD_FAMILY, 16)).grid(row=0, column=0, sticky='w', padx=15, pady=10)
+lbl_history = ctk.CTkLabel(f_left, text="History (One-Time Only)", font=(FONT_BOLD_FAMILY, 16))
+lbl_history.grid(row=0, column=0, sticky='w', padx=15, pady=10)
+
+# Search + filters; every keystroke just re-filters on the next frame
+f_filter = ctk.CTkFrame(f_left, fg_color="transparent")
+f_filter.grid(row=1, column=0, columnspan=2, sticky='ew', padx=10, pady=(0, 5))
+entry_search = ctk.CTkEntry(f_filter, placeholder_text="Search descriptions")
+entry_search.pack(side='left', fill='x', expand=True, padx=(0, 5))
+entry_from = ctk.CTkEntry(f_filter, placeholder_text="From YYYY-MM-DD", width=120)
+entry_from.pack(side='left', padx=2)
+entry_to = ctk.CTkEntry(f_filter, placeholder_text="To YYYY-MM-DD", width=120)
+entry_to.pack(side='left', padx=2)
+entry_min = ctk.CTkEntry(f_filter, placeholder_text="Min", width=70)
+entry_min.pack(side='left', padx=2)
+entry_max = ctk.CTkEntry(f_filter, placeholder_text="Max", width=70)
+entry_max.pack(side='left', padx=2)
+FILTER_ENTRIES = (entry_search, entry_from, entry_to, entry_min, entry_max)
+
+def clear_history_filter():
+    for entry in FILTER_ENTRIES:
+        entry.delete(0, 'end')
+    root.focus() # Brings the placeholders back
+    scheduler.request('lists')
+
+ctk.CTkButton(f_filter, text="Clear", command=clear_history_filter, fg_color="transparent", border_width=1,
+              text_color="#aaaaaa", width=60).pack(side='left', padx=(5, 0))
+for entry in FILTER_ENTRIES:
+    entry.bind('<KeyRelease>', lambda e: scheduler.request('lists'))
+
 tree_main = ttk.Treeview(f_left, columns=('Date', 'Desc', 'Amt'), show='headings')
 tree_main.heading('Date', text='Date'); tree_main.column('Date', width=100)
 tree_main.heading('Desc', text='Description'); tree_main.column('Desc', width=200)
 tree_main.heading('Amt', text='Amount'); tree_main.column('Amt', width=80)
-tree_main.grid(row=1, column=0, sticky='nsew', padx=10, pady=(0,10))
-sc1 = ctk.CTkScrollbar(f_left, command=tree_main.yview); sc1.grid(row=1, column=1, sticky='ns', padx=(0,10), pady=(0,10)); tree_main.configure(yscrollcommand=sc1.set)
+tree_main.grid(row=2, column=0, sticky='nsew', padx=10, pady=(0,10))
+sc1 = ctk.CTkScrollbar(f_left); sc1.grid(row=2, column=1, sticky='ns', padx=(0,10), pady=(0,10))
+history_list = VirtualList(tree_main, sc1, TREE_ROW_HEIGHT)
 
 f_l_btns = ctk.CTkFrame(f_left, fg_color="transparent")
-f_l_btns.grid(row=2, column=0, sticky='ew', padx=10, pady=10)
+f_l_btns.grid(row=3, column=0, sticky='ew', padx=10, pady=10)
 ctk.CTkButton(f_l_btns, text="Delete Selected", command=delete_selected_history, fg_color="#bf2c2c", hover_color="#992323", height=30, corner_radius=15).pack(side='left', padx=5)
 
 # Right: Rules
@@ -523,6 +736,7 @@ tree_recur.heading('Amt', text='Amount'); tree_recur.column('Amt', width=80)
 tree_recur.heading('Freq', text='Repeats Every'); tree_recur.column('Freq', width=100)
 tree_recur.grid(row=1, column=0, sticky='nsew', padx=10, pady=(0,5))
 sc2 = ctk.CTkScrollbar(f_right, command=tree_recur.yview); sc2.grid(row=1, column=1, sticky='ns', padx=(0,10), pady=(0,5)); tree_recur.configure(yscrollcommand=sc2.set)
+recur_sync = TreeSync(tree_recur)
 
 f_r_btns = ctk.CTkFrame(f_right, fg_color="transparent")
 f_r_btns.grid(row=2, column=0, sticky='ew', padx=10, pady=10)
@@ -533,14 +747,39 @@ ctk.CTkButton(f_r_btns, text="Stop & Archive", command=delete_rule, fg_color="#b
 graph_frame = ctk.CTkFrame(root, height=280, corner_radius=20)
 graph_frame.pack(fill='x', padx=15, pady=10)
 
-fig, ax = plt.subplots(figsize=(10, 3), facecolor='#2b2b2b')
-canvas = FigureCanvasTkAgg(fig, master=graph_frame)
-canvas.get_tk_widget().pack(fill='both', expand=True, padx=5, pady=(5, 0))
+# The canvas itself is built by build_graph() once the rest of the window has painted
+graph_placeholder = ctk.CTkLabel(graph_frame, text="Loading graph...", text_color="grey", height=300)
+graph_placeholder.pack(fill='both', expand=True, padx=5, pady=(5, 0))
+fig = canvas = balance_graph = None
 
 # Scrollbar for Graph
 graph_scrollbar = ctk.CTkScrollbar(graph_frame, orientation='horizontal', height=16)
 graph_scrollbar.pack(fill='x', padx=5, pady=5)
 
+def build_graph():
+    """Imports matplotlib and swaps the placeholder for the real canvas."""
+    global fig, canvas, balance_graph
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from pulsar_graph import BalanceGraph
+
+    class GraphCanvas(FigureCanvasTkAgg):
+        def draw(self):
+            with perf.span('graph draw'): super().draw()
+
+    fig = Figure(figsize=(10, 3), facecolor='#2b2b2b')
+    ax = fig.add_subplot()
+    canvas = GraphCanvas(fig, master=graph_frame)
+    canvas.mpl_connect('draw_event', on_graph_drawn)
+    graph_placeholder.destroy()
+    canvas.get_tk_widget().pack(fill='both', expand=True, padx=5, pady=(5, 0), before=graph_scrollbar)
+    balance_graph = BalanceGraph(fig, ax)
+    startup_mark('graph canvas')
+    scheduler.request('graph')
+
+def on_graph_drawn(event):
+    if display_version: startup_mark('graph drawn') # Ignore draws from before the first projection
+
 # --- Scroll Logic ---
 current_scroll_pos = 1.0 # Default to end (future)
 
@@ -548,96 +787,343 @@ def on_scroll_graph(*args):
     global current_scroll_pos
     if args[0] == 'moveto':
         current_scroll_pos = float(args[1])
-        update_graph(preserve_scroll=True)
+        scheduler.request('view')
     elif args[0] == 'scroll':
         step = int(args[1])
         current_scroll_pos = max(0.0, min(1.0, current_scroll_pos + (step * 0.05)))
-        update_graph(preserve_scroll=True)
+        scheduler.request('view')
 
 graph_scrollbar.configure(command=on_scroll_graph)
 
+# --- Refresh Scheduling ---
+
+FRAME_MS = 16
+
+class RefreshScheduler:
+    """Marks stages dirty; one root.after() callback per frame runs each dirty stage once, in order."""
+    STAGES = ('data', 'lists', 'prediction', 'graph', 'view')
+    # The lists only read the ledger; prediction + graph are requested once the background projection lands.
+    # A full graph redraw covers the view.
+    IMPLIES = {'data': ('lists',)}
+    SUPERSEDES = {'graph': ('view',)}
+
+    def __init__(self, root, handlers):
+        self.root = root
+        self.handlers = handlers
+        self.dirty = set()
+        self.pending = None
+
+    def request(self, *stages):
+        for stage in stages:
+            self.dirty.add(stage)
+            self.dirty.update(self.IMPLIES.get(stage, ()))
+        if self.pending is None:
+            self.pending = self.root.after(FRAME_MS, self.flush)
+
+    def flush(self):
+        self.pending = None
+        dirty, self.dirty = self.dirty, set()
+        for stage in self.STAGES:
+            if stage not in dirty: continue
+            with perf.span(f"refresh {stage}"): self.handlers[stage]()
+            for skipped in self.SUPERSEDES.get(stage, ()): dirty.discard(skipped)
+
+# --- Background Projection ---
+
+POLL_MS = 30
+
+class ProjectionWorker:
+    """Runs compute_projection off the Tk thread; a new job cancels the one in flight."""
+    def __init__(self, root, on_done, on_error, snapshot=None):
+        self.root = root
+        self.snapshot = snapshot
+        self.on_done = on_done
+        self.on_error = on_error
+        self.results = queue.Queue()
+        self.generation = 0
+        self.cancel_event = None
+        self.polling = False
+
+    @property
+    def busy(self):
+        return self.cancel_event is not None
+
+    def cancel(self):
+        """Drops the job in flight, if any."""
+        if self.cancel_event is not None: self.cancel_event.set()
+        self.cancel_event = None
+        self.generation += 1
+
+    def submit(self, static, rules, years, key=None):
+        self.cancel()
+        self.cancel_event = threading.Event()
+        threading.Thread(target=self._run, args=(self.generation, self.cancel_event, static, rules, years, key), daemon=True).start()
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_MS, self._poll)
+
+    def _run(self, generation, cancel, static, rules, years, key):
+        try:
+            with perf.span('projection') as s:
+                projection, rule_ids = compute_projection(static, rules, years, cancel, sources=True)
+                index = BalanceIndex.from_projection(projection)
+                index.rollups # Built here rather than on the Tk thread at the first zoomed-out draw
+                s.count(len(projection))
+            self.results.put((generation, (projection, index, rule_ids), None))
+        except ProjectionCancelled:
+            return
+        except Exception as e:
+            self.results.put((generation, None, e))
+            return
+        if self.snapshot is None or key is None: return
+        try:
+            with perf.span('save snapshot') as s:
+                self.snapshot.save(key, projection, rule_ids)
+                s.count(len(projection))
+        except: pass # Only a cache; the next launch just projects again
+
+    def _poll(self):
+        while True:
+            try: generation, result, error = self.results.get_nowait()
+            except queue.Empty: break
+            if generation != self.generation: continue # Superseded
+            self.cancel_event = None
+            if error is not None: self.on_error(error)
+            else: self.on_done(result)
+        if self.busy: self.root.after(POLL_MS, self._poll)
+        else: self.polling = False
+
+def start_projection():
+    # The saved projection if there's one for this ledger, range and day; otherwise project in the background
+    load_data()
+    years = forecast_years()
+    key = None
+    try:
+        with perf.span('load snapshot') as s:
+            key = ledger.snapshot.key(years)
+            cached = ledger.snapshot.load(key, df_static, df_rules)
+            if cached is not None: s.count(len(cached[0]))
+    except: cached = None
+    if cached is not None:
+        projection_worker.cancel()
+        projection, rule_ids = cached
+        on_projection_done((projection, BalanceIndex.from_projection(projection), rule_ids))
+        return
+    projection_worker.submit(df_static, df_rules, years, key)
+    lbl_pred_main.configure(text="Calculating...", text_color="grey")
+    lbl_pred_sub.configure(text=f"Projecting {len(df_rules)} recurring items over {proj_var.get()}")
+
+def on_projection_done(result):
+    set_projection(*result)
+    startup_mark('projection ready')
+    scheduler.request('prediction', 'graph')
+
+def on_projection_error(error):
+    lbl_pred_main.configure(text="Forecast Failed", text_color="#ff4d4d")
+    messagebox.showerror("Error", f"Failed to build forecast: {error}")
+
+projection_worker = ProjectionWorker(root, on_projection_done, on_projection_error, ledger.snapshot)
+
+# --- Diagnostics ---
+
+PROBE_MS = 50
+STALL_MS = 100 # Lag at or above this is also counted as a stall
+
+class LatencyProbe:
+    """How late root.after callbacks fire, i.e. how long events wait on the main loop. Only ticks while perf is on."""
+    def __init__(self, root):
+        self.root = root
+        self.running = False
+        self.expected = 0.0
+
+    def start(self):
+        if self.running or not perf.enabled: return
+        self.running = True
+        self.expected = time.perf_counter() + PROBE_MS / 1000
+        self.root.after(PROBE_MS, self._tick)
+
+    def _tick(self):
+        if not perf.enabled:
+            self.running = False
+            return
+        now = time.perf_counter()
+        lag = max(0.0, now - self.expected)
+        perf.record('main loop lag', lag)
+        if lag * 1000 >= STALL_MS: perf.record('main loop stall', lag)
+        self.expected = now + PROBE_MS / 1000
+        self.root.after(PROBE_MS, self._tick)
+
+latency_probe = LatencyProbe(root)
+diag_window = None
+
+def open_diagnostics(event=None):
+    """Hidden performance panel (Ctrl+Shift+D): rolling timings per stage. Turns collection on while open."""
+    global diag_window
+    if diag_window is not None and diag_window.winfo_exists():
+        diag_window.lift(); return
+
+    started_here = not perf.enabled
+    if started_here: perf.enable()
+    latency_probe.start()
+
+    win = ctk.CTkToplevel(root)
+    diag_window = win
+    win.title("Diagnostics")
+    win.geometry("760x420")
+    apply_icon(win)
+    text = ctk.CTkTextbox(win, font=("Courier", 12), wrap='none')
+    text.pack(fill='both', expand=True, padx=10, pady=(10, 5))
+
+    def render():
+        if not win.winfo_exists(): return
+        lines = [f"{'Stage':<24}{'n':>5}{'last ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'rows':>11}"]
+        for row in perf.stats():
+            rows = "" if row['rows'] is None else f"{row['rows']:,}"
+            lines.append(f"{row['stage']:<24}{row['count']:>5}{row['last'] * 1000:>10.2f}{row['p50'] * 1000:>10.2f}"
+                         f"{row['p95'] * 1000:>10.2f}{row['max'] * 1000:>10.2f}{rows:>11}")
+        if len(lines) == 1: lines.append("No samples yet. Use the app and they will show up here.")
+        loaded, cache = store.stats(), projection_cache.stats()
+        lines += ["",
+                  f"Ledger ({loaded['backend']}): {loaded['static_rows']:,} transactions, {loaded['rules']:,} rules, "
+                  f"{loaded['reloads']} reloads, {loaded['reloads_avoided']} avoided",
+                  f"Rule cache: {cache['rules']:,} rules, {cache['hits']} hits, {cache['extends']} extended, "
+                  f"{cache['misses']} misses, {cache['evictions']} evicted"]
+        text.configure(state='normal')
+        text.delete('1.0', 'end')
+        text.insert('1.0', "\n".join(lines))
+        text.configure(state='disabled')
+        win.after(1000, render)
+
+    def close():
+        global diag_window
+        if started_here: perf.disable() # Back to zero cost
+        diag_window = None
+        win.destroy()
+
+    btns = ctk.CTkFrame(win, fg_color="transparent")
+    btns.pack(fill='x', padx=10, pady=(0, 10))
+    ctk.CTkButton(btns, text="Reset", command=lambda: (perf.reset(), render()), width=100).pack(side='left')
+    ctk.CTkButton(btns, text="Close", command=close, fg_color="grey", width=100).pack(side='right')
+    win.protocol("WM_DELETE_WINDOW", close)
+    render()
+
+root.bind('<Control-D>', open_diagnostics) # Ctrl+Shift+D
+
 # --- Update Logic ---
 
 def update_prediction_ui():
+    if projection_worker.busy: return # Still showing "Calculating..."
     if df_display.empty:
         lbl_pred_main.configure(text="No Data Available", text_color="grey")
+        startup_mark('forecast shown')
         return
 
     p_text = proj_var.get()
-    if "Month" in p_text:
-        months = int(p_text.split()[0])
-        years = months / 12.0
-    else:
-        try: years = int(p_text.split()[0])
-        except: years = 1
-    
-    now = datetime.now()
-    target_date = now + timedelta(days=365*years)
-    
-    past_mask = df_display['Date'] <= now
-    if past_mask.any(): current_bal = df_display.loc[past_mask, 'Balance'].iloc[-1]
-    else: current_bal = 0.0
-
-    future_mask = df_display['Date'] <= target_date
-    if future_mask.any(): final_bal = df_display.loc[future_mask, 'Balance'].iloc[-1]
-    else: final_bal = current_bal
-
-    net_change = final_bal - current_bal
+    summary = forecast_summary(balance_index, forecast_years())
+    final_bal = summary['final_balance']
+    net_change = summary['net_change']
     sign = "+" if net_change >= 0 else "-"
     color = "#2cc985" if net_change >= 0 else "#ff4d4d"
     
     lbl_pred_title.configure(text=f"Forecast for the next {p_text}")
     lbl_pred_main.configure(text=f"{sign}{CURRENT_CURRENCY}{abs(net_change):,.2f}", text_color=color)
     lbl_pred_sub.configure(text=f"Projected Balance: {CURRENT_CURRENCY}{final_bal:,.2f}")
+    startup_mark('forecast shown')
+
+def forecast_years():
+    return range_to_years(proj_var.get())
 
 def refresh_data():
-    p_text = proj_var.get()
-    if "Month" in p_text:
-        months = int(p_text.split()[0])
-        years = months / 12.0
-    else:
-        try: years = int(p_text.split()[0])
-        except: years = 1
+    """Recomputes the projection and everything drawn from it (on the next frame)."""
+    scheduler.request('data')
 
-    generate_projection(years)
-    update_lists()
-    update_prediction_ui()
-    update_graph(preserve_scroll=False)
+history_source = None # df_static the history order was built from
+history_order = HistoryOrder()
+history_search = HistorySearch() # Kept in step with history_order
+history_filter = None # Filters the history list was last shown with
+rules_source = None # (df_rules, currency) the rules list was built from
 
 def update_lists():
-    for i in tree_main.get_children(): tree_main.delete(i)
-    for i in tree_recur.get_children(): tree_recur.delete(i)
-
-    # --- FIX START: Use Dataframe Index as IID ---
-    if not df_static.empty:
-        hist_view = df_static.sort_values('Date', ascending=False)
-        for idx, row in hist_view.iterrows():
-            vals = (str(row['Date'].date()), row['Description'], f"{CURRENT_CURRENCY}{row['Amount']:.2f}")
-            # Bind the DataFrame index (idx) to the visual row (iid)
-            tree_main.insert('', 'end', iid=str(idx), values=vals)
-    # --- FIX END ---
-
-    if not df_rules.empty:
-        for _, row in df_rules.iterrows():
-            try: 
-                ival = float(row['Interval'])
-                ival_str = str(int(ival)) if ival.is_integer() else str(ival)
-            except: ival_str = str(row['Interval'])
-
-            freq_str = f"Every {ival_str} {row['Unit']}"
-            if pd.notnull(row['EndDate']):
-                freq_str += f" until {row['EndDate'].date()}"
-            vals = (str(row['StartDate'].date()), row['Description'], f"{CURRENT_CURRENCY}{row['Amount']:.2f}", freq_str)
-            tree_recur.insert('', 'end', values=vals)
+    with perf.span('history list') as s:
+        update_history_list()
+        s.count(len(df_static))
+
+    with perf.span('rules list') as s:
+        update_rules_list()
+        s.count(len(df_rules))
+
+def read_history_filter():
+    """(query, from, to, min, max) from the filter entries. A field that doesn't parse is ignored and outlined red."""
+    def parse(entry, convert):
+        text = entry.get().strip()
+        value = None
+        if text:
+            try: value = convert(text)
+            except: pass
+        entry.configure(border_color="#ff4d4d" if text and value is None else ctk.ThemeManager.theme['CTkEntry']['border_color'])
+        return value
+    return (entry_search.get().strip(), parse(entry_from, pd.Timestamp), parse(entry_to, pd.Timestamp),
+            parse(entry_min, clean_amount), parse(entry_max, clean_amount))
+
+def update_history_list():
+    global history_source, history_filter
+
+    # Bind the DataFrame index to the visual row (iid). Only rows in view exist as items,
+    # and only rows whose index or values changed get touched.
+    if df_static is not history_source:
+        history_source = df_static
+        # Newest first; df_static has a RangeIndex, so positions are the index
+        history_order.rebuild(df_static['Date'].to_numpy(dtype='datetime64[ns]') if not df_static.empty else EMPTY_DATES)
+        history_search.rebuild(df_static)
+
+    filters = read_history_filter()
+    top = filters != history_filter # New filter, so start from the newest match
+    history_filter = filters
+    if df_static.empty:
+        lbl_history.configure(text="History (One-Time Only)")
+        history_list.set_keys(np.arange(0), None, top); return
+
+    keys = history_order.keys
+    if any(f is not None and f != '' for f in filters):
+        with perf.span('history search') as s:
+            keys = history_search.filter(keys, *filters)
+            s.count(len(df_static))
+        lbl_history.configure(text=f"History: {len(keys):,} of {len(df_static):,}")
+    else:
+        lbl_history.configure(text="History (One-Time Only)")
+    # Only the rows in view get formatted, so reading them straight from df_static is cheap
+    dates, descs, amounts = df_static['Date'], df_static['Description'], df_static['Amount']
+    history_list.set_keys(keys, lambda i: (str(dates.iat[i])[:10], descs.iat[i], f"{CURRENT_CURRENCY}{amounts.iat[i]:.2f}"), top)
+
+def update_rules_list():
+    global rules_source
+    if rules_source is not None and rules_source[0] is df_rules and rules_source[1] == CURRENT_CURRENCY: return
+    rules_source = (df_rules, CURRENT_CURRENCY)
+
+    rows = []
+    for pos, row in enumerate(df_rules.itertuples(index=False)):
+        try: 
+            ival = float(row.Interval)
+            ival_str = str(int(ival)) if ival.is_integer() else str(ival)
+        except: ival_str = str(row.Interval)
+
+        freq_str = f"Every {ival_str} {row.Unit}"
+        if pd.notnull(row.EndDate):
+            freq_str += f" until {row.EndDate.date()}"
+        rows.append((str(pos), (str(row.StartDate.date()), row.Description, f"{CURRENT_CURRENCY}{row.Amount:.2f}", freq_str)))
+    recur_sync.show(rows)
 
 def update_graph(preserve_scroll=True):
-    ax.clear()
-    ax.set_facecolor('#2b2b2b')
-    if df_display.empty: canvas.draw(); return
+    global display_patch
+    if balance_graph is None: return # build_graph() requests a full draw once it's done
+    if not len(balance_index):
+        balance_graph.set_data(df_display, display_version, balance_index)
+        display_patch = None
+        canvas.draw_idle(); return
 
     # Total Range
-    min_date = df_display['Date'].min()
-    max_date = df_display['Date'].max()
+    min_date = balance_index.first_date
+    max_date = balance_index.last_date
     total_days = (max_date - min_date).days
     if total_days <= 0: total_days = 1
 
@@ -667,68 +1153,38 @@ def update_graph(preserve_scroll=True):
     start_offset_days = total_days * current_scroll_pos
     view_start_date = min_date + timedelta(days=start_offset_days)
     view_end_date = view_start_date + timedelta(days=view_days)
-    
-    df_plot = df_display
-    
-    dates = df_plot['Date'].to_numpy()
-    balances = df_plot['Balance'].to_numpy()
-    dates_num = mdates.date2num(dates)
-
-    points = np.column_stack([dates_num, balances]).reshape(-1, 1, 2)
-    segments = np.concatenate([points[:-1], points[1:]], axis=1)
-    
-    deltas = np.diff(balances)
-    cmap = ListedColormap(['#ff3333', '#2cc985'])
-    norm = BoundaryNorm([-float('inf'), 0, float('inf')], cmap.N)
-    lc = LineCollection(segments, cmap=cmap, norm=norm)
-    lc.set_array(deltas)
-    lc.set_linewidth(2)
-    ax.add_collection(lc)
-    
-    mask_view = (df_plot['Date'] >= view_start_date) & (df_plot['Date'] <= view_end_date)
-    df_view = df_plot.loc[mask_view]
-    
-    if not df_view.empty:
-        ax.scatter(df_view['Date'], df_view['Balance'], color='#aaaaaa', s=10, zorder=3, alpha=0.6)
-        
-        for idx, row in df_view.iterrows():
-            ax.annotate(row['Description'], 
-                        (mdates.date2num(row['Date']), row['Balance']),
-                        xytext=(0, 10 if idx % 2 == 0 else -15), 
-                        textcoords='offset points',
-                        fontsize=7, color='#888888', ha='center',
-                        arrowprops=dict(arrowstyle="-", color='#444444', lw=0.5))
-
-    ax.axvline(x=mdates.date2num(datetime.now()), color='white', linestyle=':', linewidth=1.5, alpha=0.7)
-
-    ax.set_xlim(mdates.date2num(view_start_date), mdates.date2num(view_end_date))
-    
-    mask = (df_display['Date'] >= view_start_date) & (df_display['Date'] <= view_end_date)
-    visible_bals = df_display.loc[mask, 'Balance']
-    if not visible_bals.empty:
-        y_min, y_max = visible_bals.min(), visible_bals.max()
-        margin = (y_max - y_min) * 0.1 if y_max != y_min else 100
-        ax.set_ylim(y_min - margin, y_max + margin)
-    else:
-        ax.set_ylim(balances.min(), balances.max())
 
-    ax.fill_between(dates_num, balances, 0, where=(balances>=0), color='#2cc985', alpha=0.1)
-    ax.fill_between(dates_num, balances, 0, where=(balances<0), color='#ff3333', alpha=0.1)
-    
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-    ax.tick_params(colors='#aaaaaa', labelsize=9)
-    for s in ax.spines.values(): s.set_edgecolor('#404040')
-    ax.set_ylabel(f"Balance ({CURRENT_CURRENCY})", color='#aaaaaa')
-    ax.grid(True, color='#404040', alpha=0.3)
-    fig.autofmt_xdate()
-    canvas.draw()
+    # Artists are only rebuilt when the projection itself changed; scrolling/zooming just moves the view
+    with perf.span('graph data') as s:
+        if display_patch is not None and balance_graph.data_key == display_patch[0]:
+            # Only patched since the last draw: keep the artists
+            changed = balance_graph.update_data(df_display, display_version, balance_index, display_patch[1])
+        else:
+            changed = balance_graph.set_data(df_display, display_version, balance_index)
+        display_patch = None
+        if changed: s.count(len(df_display))
+    with perf.span('graph view'):
+        balance_graph.set_view(view_start_date, view_end_date, f"Balance ({CURRENT_CURRENCY})")
+    canvas.draw_idle()
+
+scheduler = RefreshScheduler(root, {
+    'data': start_projection,
+    'lists': update_lists,
+    'prediction': update_prediction_ui,
+    'graph': lambda: update_graph(preserve_scroll=False),
+    'view': lambda: update_graph(preserve_scroll=True),
+})
 
 # Styles
 s = ttk.Style()
 s.theme_use('clam')
-s.configure("Treeview", background="#2b2b2b", foreground="white", fieldbackground="#2b2b2b", borderwidth=0, font=font_reg, rowheight=25)
+s.configure("Treeview", background="#2b2b2b", foreground="white", fieldbackground="#2b2b2b", borderwidth=0, font=font_reg, rowheight=TREE_ROW_HEIGHT)
 s.configure("Treeview.Heading", background="#1a1a1a", foreground="white", relief="flat", font=font_bold)
 s.map("Treeview", background=[('selected', '#1f538d')])
 
+startup_mark('window built')
+latency_probe.start() # No-op unless PULSAR_PERF is set
 refresh_data()
+# Runs after the first idle pass, i.e. once the window chrome has been drawn
+root.after_idle(lambda: root.after(0, on_first_paint))
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,291 @@
+"""
+Benchmarks Pulsar's hot paths on synthetic ledgers.
+
+    python benchmarks/bench.py                          # small, medium and large
+    python benchmarks/bench.py --scales small xlarge --repeat 5
+    python benchmarks/bench.py --compare benchmarks/results/bench-20250101-120000.json
+
+Times loading the ledger, projecting every Forecast Range (with a cold and a warm
+rule cache), the dashboard's balance lookups and a headless graph render at each
+zoom level. The peak memory traced during each operation is recorded too, and so
+are the rule cache's hits and misses and the store's avoided reloads while it ran.
+Results are written as JSON, so runs can be compared against each other.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from pulsar_engine import Ledger, BalanceIndex, BACKENDS, FORECAST_RANGES, STORAGE_BACKEND, forecast_summary, projection_cache, range_to_years
+from pulsar_graph import BalanceGraph
+
+# --- Configuration ---
+SCALES = { # name -> (static rows, recurring rules)
+    'small': (1_000, 10),
+    'medium': (100_000, 250),
+    'large': (1_000_000, 1_000),
+    'xlarge': (10_000_000, 5_000),
+}
+DEFAULT_SCALES = ['small', 'medium', 'large'] # xlarge needs several GB of RAM
+ZOOM_LEVELS = {"1 Month": 30, "1 Year": 365, "All Time": None} # Same view widths as the Zoom Level combo
+GRAPH_RANGE = "1 Year" # Forecast Range the graph is rendered for (the app's default)
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+UNITS = ['Days', 'Weeks', 'Months', 'Years']
+UNIT_WEIGHTS = [0.1, 0.3, 0.5, 0.1]
+BASE_INTERVALS = {'Days': [1, 3, 7, 14, 30], 'Weeks': [1, 2, 4], 'Months': [1, 2, 3, 6, 12], 'Years': [1, 2]}
+FRACTIONAL_SHARE = 0.25 # Rules whose interval gets an extra half (1.5 Weeks, 0.5 Months...)
+END_DATE_SHARE = 0.3
+
+# --- Synthetic Ledgers ---
+
+def make_descriptions(rng, count):
+    words = ['Grocer', 'Coffee', 'Rent', 'Payroll', 'Transit', 'Gym', 'Books', 'Utilities', 'Insurance',
+             'Phone', 'Cinema', 'Pharmacy', 'Fuel', 'Streaming', 'Hardware', 'Bakery', 'Parking', 'Dividend']
+    return np.array([f"{words[i % len(words)]} {i // len(words) + 1}" for i in rng.permutation(count)])
+
+def make_static(rng, rows, now):
+    """rows one-time transactions spread over the last five years."""
+    seconds = rng.integers(0, 5 * 365 * 86400, rows)
+    dates = np.datetime64(now, 's') - seconds.astype('timedelta64[s]')
+    pool = make_descriptions(rng, max(50, min(5_000, rows // 20)))
+    amounts = np.round(rng.normal(-20.0, 150.0, rows), 2)
+    return pd.DataFrame({
+        'Date': np.sort(dates).astype('datetime64[ns]'),
+        'Description': pool[rng.integers(0, len(pool), rows)],
+        'Amount': amounts,
+        'Type': 'Static',
+    })
+
+def make_rules(rng, count, now):
+    """Recurring rules with mixed units, fractional intervals and some EndDates."""
+    units = rng.choice(UNITS, size=count, p=UNIT_WEIGHTS)
+    intervals = np.array([float(rng.choice(BASE_INTERVALS[u])) for u in units])
+    intervals[rng.random(count) < FRACTIONAL_SHARE] += 0.5
+
+    start = np.datetime64(now, 's') - rng.integers(-180 * 86400, 3 * 365 * 86400, count).astype('timedelta64[s]')
+    start = start.astype('datetime64[D]').astype('datetime64[ns]') # Rules are entered as whole days
+    end = start + rng.integers(30, 10 * 365, count).astype('timedelta64[D]')
+    end[rng.random(count) >= END_DATE_SHARE] = np.datetime64('NaT')
+
+    amounts = np.where(rng.random(count) < 0.2, rng.uniform(500, 5_000, count), -rng.uniform(5, 800, count))
+    return pd.DataFrame({
+        'StartDate': start,
+        'Description': make_descriptions(rng, count),
+        'Amount': np.round(amounts, 2),
+        'Interval': intervals,
+        'Unit': units,
+        'EndDate': end,
+    })
+
+def build_ledger(folder, scale, backend, seed, now):
+    """Writes a synthetic ledger to folder, unless one for the same scale/seed/backend is already there."""
+    rows, rules = SCALES[scale]
+    marker = os.path.join(folder, 'bench.json')
+    spec = {'scale': scale, 'static_rows': rows, 'rules': rules, 'backend': backend, 'seed': seed, 'date': now.strftime('%Y-%m-%d')}
+    try:
+        with open(marker) as f:
+            if json.load(f) == spec: return False
+    except: pass
+
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    rng = np.random.default_rng(seed)
+    store = BACKENDS[backend](folder)
+    store.write_static(make_static(rng, rows, now))
+    store.write_rules(make_rules(rng, rules, now))
+    with open(marker, 'w') as f: json.dump(spec, f)
+    return True
+
+# --- Measurement ---
+
+COUNTERS = ('reloads', 'reloads_avoided', 'hits', 'misses', 'extends', 'evictions') # Store and rule cache stats worth diffing
+
+def measure(fn, repeat, setup=None, memory=True):
+    """Wall time of fn over repeat runs (setup runs before each, untimed), plus peak traced memory of one more run."""
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    peak_mb = None
+    if memory:
+        if setup: setup()
+        tracemalloc.start()
+        try:
+            fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return {'min_s': min(times), 'median_s': statistics.median(times), 'runs': repeat, 'peak_mb': peak_mb}
+
+def counted(source, run):
+    """run()'s result, plus how much each of source.stats()'s counters moved while it ran."""
+    before = source.stats()
+    result = run()
+    after = source.stats()
+    return result, {k: after[k] - before[k] for k in after if k in COUNTERS}
+
+def graph_view(projection, view_days, now):
+    """The view window update_graph shows when the graph is first drawn (today at the left edge)."""
+    min_date = projection['Date'].min()
+    max_date = projection['Date'].max()
+    total_days = max(1, (max_date - min_date).days)
+    if view_days is None: view_days = total_days
+    visible_ratio = min(1.0, view_days / total_days)
+    pos = (now - min_date).days / total_days if min_date <= now <= max_date else 0.0
+    pos = max(0.0, min(1.0 - visible_ratio, pos))
+    start = min_date + timedelta(days=total_days * pos)
+    return start, start + timedelta(days=view_days)
+
+def bench_scale(scale, folder, backend, repeat, memory, now, report):
+    rows, rules = SCALES[scale]
+    base = {'scale': scale, 'static_rows': rows, 'rules': rules}
+
+    def record(op, stats, **extra):
+        entry = dict(base, op=op, **extra, **stats)
+        report(entry)
+        return entry
+
+    results = []
+    results.append(record('load', measure(lambda: Ledger(folder, backend).load(), repeat, memory=memory)))
+    ledger = Ledger(folder, backend)
+    ledger.load()
+    stats, store = counted(ledger.store, lambda: measure(ledger.load, repeat, memory=memory))
+    results.append(record('load (unchanged)', stats, store=store))
+
+    projections = {}
+    for p_text in FORECAST_RANGES:
+        years = range_to_years(p_text)
+        projections[p_text] = projection = ledger.project(years)
+        rows_out = len(projection)
+        stats, cache = counted(projection_cache, lambda: measure(lambda: ledger.project(years), repeat, setup=projection_cache.clear, memory=memory))
+        results.append(record('projection', stats, range=p_text, projected_rows=rows_out, cache=cache))
+        stats, cache = counted(projection_cache, lambda: measure(lambda: ledger.project(years), repeat, memory=memory))
+        results.append(record('projection (warm cache)', stats, range=p_text, projected_rows=rows_out, cache=cache))
+        results.append(record('balance index', measure(lambda: BalanceIndex.from_projection(projection), repeat, memory=memory),
+                              range=p_text, projected_rows=rows_out))
+        results.append(record('balance index + rollups', measure(lambda: BalanceIndex.from_projection(projection).rollups, repeat, memory=memory),
+                              range=p_text, projected_rows=rows_out))
+        index = BalanceIndex.from_projection(projection)
+        results.append(record('balance lookups', measure(lambda: forecast_summary(index, years, now), repeat, memory=memory),
+                              range=p_text, projected_rows=rows_out))
+
+    projection = projections[GRAPH_RANGE]
+    index = BalanceIndex.from_projection(projection) # Built on the worker thread in the app, rollups included
+    index.rollups
+    fig = Figure(figsize=(10, 3), facecolor='#2b2b2b')
+    ax = fig.add_subplot()
+    FigureCanvasAgg(fig)
+    graph = BalanceGraph(fig, ax)
+    for zoom, view_days in ZOOM_LEVELS.items():
+        start, end = graph_view(projection, view_days, now)
+
+        def render():
+            graph.set_data(projection, object(), index) # New key, so every artist is rebuilt
+            graph.set_view(start, end, "Balance ($)")
+            fig.canvas.draw()
+
+        def scroll():
+            graph.set_view(start, end, "Balance ($)")
+            fig.canvas.draw()
+
+        results.append(record('graph render', measure(render, repeat, memory=memory), range=GRAPH_RANGE, zoom=zoom, projected_rows=len(projection)))
+        results.append(record('graph view only', measure(scroll, repeat, memory=memory), range=GRAPH_RANGE, zoom=zoom, projected_rows=len(projection)))
+    return results
+
+# --- Reporting ---
+
+def result_key(entry):
+    return (entry['scale'], entry['op'], entry.get('range'), entry.get('zoom'))
+
+def describe(entry):
+    parts = [entry['scale'], entry['op']]
+    if entry.get('range'): parts.append(entry['range'])
+    if entry.get('zoom'): parts.append(f"zoom {entry['zoom']}")
+    return ' / '.join(parts)
+
+def print_entry(entry, baseline=None):
+    line = f"{describe(entry):<58}{entry['median_s'] * 1000:10.2f} ms"
+    if entry['peak_mb'] is not None: line += f"{entry['peak_mb']:10.1f} MB"
+    if entry.get('cache'): line += f"   cache {entry['cache']['hits']} hits, {entry['cache']['extends']} extended, {entry['cache']['misses']} misses"
+    if entry.get('store'): line += f"   {entry['store']['reloads_avoided']} reloads avoided"
+    if baseline is not None:
+        old = baseline.get(result_key(entry))
+        if old and old['median_s'] > 0: line += f"   {entry['median_s'] / old['median_s']:.2f}x baseline time"
+    print(line, flush=True)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except: return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Pulsar's load, projection, lookup and graph paths.")
+    parser.add_argument('--scales', nargs='+', default=DEFAULT_SCALES, choices=list(SCALES), help="Ledger sizes to run")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per operation (the median is reported)")
+    parser.add_argument('--backend', default=STORAGE_BACKEND, choices=sorted(BACKENDS), help="Storage format of the synthetic ledgers")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', help="Where to keep the generated ledgers (reused between runs). Default: a temp folder")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc run (faster on big scales)")
+    parser.add_argument('--output', help="JSON file to write. Default: benchmarks/results/bench-<timestamp>.json")
+    parser.add_argument('--compare', help="Earlier results JSON to show speed ratios against")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {result_key(e): e for e in json.load(f)['results']}
+
+    now = datetime.now().replace(microsecond=0)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='pulsar-bench-')
+    results = []
+    try:
+        for scale in args.scales:
+            folder = os.path.join(workdir, f"{scale}-{args.backend}-{args.seed}")
+            t0 = time.perf_counter()
+            if build_ledger(folder, scale, args.backend, args.seed, now):
+                print(f"Generated {scale} ledger in {time.perf_counter() - t0:.1f} s", flush=True)
+            projection_cache.clear()
+            results += bench_scale(scale, folder, args.backend, args.repeat, not args.no_memory, now, lambda e: print_entry(e, baseline))
+    finally:
+        if not args.workdir: shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{now.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {
+        'timestamp': now.isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+        'backend': args.backend,
+        'repeat': args.repeat,
+        'seed': args.seed,
+    }
+    with open(output, 'w') as f: json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f"Results saved to {output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Checks the fast recurrence paths against the plain loop they replaced.
+
+    python benchmarks/check.py
+    python benchmarks/check.py --seed 7
+
+expand_rule (and the rule cache growing an entry to a later cutoff) must give exactly
+the dates the original projection loop got by stepping with add_interval, for every
+unit, whole and fractional intervals, month-end starts and EndDates. A forecast
+patched by insert_static_row / remove_static_rows must match a full compute_projection
+of the same ledger after every step, ties on a date included. Rows saved to a new
+ledger, in every storage format, must load back in a fresh Ledger, also after a reset.
+Exits non-zero and prints the first few differences if anything disagrees.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from pulsar_engine import (BACKENDS, BalanceIndex, Ledger, ProjectionCache, add_interval, append_frame, compute_projection, expand_rule,
+                           insert_static_row, normalize_rules, normalize_static, remove_static_rows, rule_cutoff)
+from bench import make_rules, make_static
+
+UNITS = ['Days', 'Weeks', 'Months', 'Years']
+INTERVALS = [1, 2, 3, 12, 0.5, 1.5, 2.25, 0, -1, 'x'] # 0 and -1 never advance; add_interval reads 'x' as 1
+STARTS = ['2024-01-31', '2024-02-29', '2023-08-31', '2024-03-30', '2024-12-31', '2025-06-15 13:45:10']
+MAX_SHOWN = 10
+PATCH_STEPS = 200 # Random adds and deletes applied to one forecast
+PATCH_YEARS = 2.0
+
+def baseline(start, interval, unit, cutoff):
+    """The original projection loop. Rules that never advance give their start date once (it looped forever)."""
+    dates = []
+    current = start
+    while current <= cutoff:
+        dates.append(current)
+        following = add_interval(current, interval, unit)
+        if following <= current: break
+        current = following
+    return np.array(dates, dtype='datetime64[ns]')
+
+def end_dates(rng, start):
+    """No EndDate, one before the start, the start itself, an exact later occurrence and a random day."""
+    return [pd.NaT, start - timedelta(days=1), start, add_interval(add_interval(start, 1, 'Months'), 1, 'Months'),
+            start + timedelta(days=int(rng.integers(1, 4 * 365)))]
+
+def check_rules(rng, now):
+    failures = []
+    limit = now + timedelta(days=365 * 10)
+    for unit in UNITS:
+        for interval in INTERVALS:
+            for start in map(pd.Timestamp, STARTS):
+                for end in end_dates(rng, start):
+                    cutoff = rule_cutoff(end, limit)
+                    expected = baseline(start, interval, unit, cutoff)
+                    case = f"{interval} {unit} from {start} to {end}"
+                    if not np.array_equal(expand_rule(start, interval, unit, cutoff), expected):
+                        failures.append(f"expand_rule: {case}")
+                    # A cache entry expanded to an earlier cutoff, then extended
+                    rule = pd.Series({'StartDate': start, 'Amount': 1.0, 'Interval': interval, 'Unit': unit, 'EndDate': end})
+                    cache = ProjectionCache()
+                    cache.occurrences(rule, rule_cutoff(end, now))
+                    if not np.array_equal(cache.occurrences(rule, cutoff), expected):
+                        failures.append(f"rule cache: {case}")
+    return failures
+
+def same_projection(patched, index, full):
+    """Where patched (and its BalanceIndex) differ from the full rebuild, or None."""
+    try:
+        pd.testing.assert_frame_equal(patched.reset_index(drop=True), full, check_categorical=False)
+    except AssertionError as e:
+        return str(e).splitlines()[0]
+    expected = BalanceIndex.from_projection(full)
+    if not (np.array_equal(index.dates, expected.dates) and np.array_equal(index.balances, expected.balances)):
+        return "balance index"
+    return None
+
+def check_patches(rng, now):
+    static = normalize_static(make_static(rng, 2_000, now))
+    rules = make_rules(rng, 40, now)
+    month_ends = rules.iloc[:4].assign(StartDate=pd.to_datetime(['2024-01-31', '2024-02-29', '2023-08-31', '2024-12-31']),
+                                       Interval=[1.0, 1.0, 3.0, 1.0], Unit=['Months', 'Months', 'Months', 'Years'])
+    rules = normalize_rules(pd.concat([rules, month_ends], ignore_index=True))
+    projection = compute_projection(static, rules, PATCH_YEARS)
+    descriptions = static['Description'].unique()
+
+    failures = []
+    for step in range(PATCH_STEPS):
+        if rng.random() < 0.6 or len(static) < 10:
+            if rng.random() < 0.5: # Same second as rows already there, history or rule
+                date = projection['Date'].iat[rng.integers(len(projection))]
+            else:
+                date = pd.Timestamp(now) - timedelta(seconds=int(rng.integers(-365 * 86400, 5 * 365 * 86400)))
+            desc = f"New {rng.integers(5)}" if rng.random() < 0.3 else str(rng.choice(descriptions))
+            amount = round(float(rng.normal(-20.0, 150.0)), 2)
+            action = f"add {desc} {amount} on {date}"
+            result = insert_static_row(projection, date, desc, amount)
+            static = append_frame(static, pd.DataFrame({'Date': [date], 'Description': [desc], 'Amount': [amount], 'Type': ['Static']}))
+        else:
+            positions = rng.choice(len(static), int(rng.integers(1, 4)), replace=False)
+            action = f"delete rows {sorted(positions.tolist())}"
+            result = remove_static_rows(projection, static.iloc[positions])
+            static = static.drop(static.index[positions]).reset_index(drop=True)
+        if result is None:
+            failures.append(f"step {step}, {action}: couldn't patch")
+            break
+        projection, index, _ = result
+        problem = same_projection(projection, index, compute_projection(static, rules, PATCH_YEARS))
+        if problem:
+            failures.append(f"step {step}, {action}: {problem}")
+            break # Later steps would only repeat it
+    return failures
+
+def check_new_ledgers():
+    failures = []
+    for backend in sorted(BACKENDS):
+        folder = tempfile.mkdtemp(prefix='pulsar-check-')
+        try:
+            ledger = Ledger(folder, backend)
+            for attempt in ('new ledger', 'after reset'):
+                if attempt == 'after reset': ledger.store.reset()
+                ledger.load()
+                ledger.save_static(pd.Timestamp('2025-01-31 09:30:00'), 'Coffee', -4.5)
+                ledger.save_static(pd.Timestamp('2025-02-01'), 'Payroll', 2500.0)
+                ledger.save_rule(pd.Timestamp('2025-01-31'), 'Rent', -900.0, 1.0, 'Months')
+                try:
+                    static, rules = Ledger(folder, backend).load()
+                except Exception as e:
+                    failures.append(f"{backend}, {attempt}: {type(e).__name__}: {e}"); continue
+                if static['Description'].astype(str).tolist() != ['Coffee', 'Payroll'] or static['Amount'].tolist() != [-4.5, 2500.0]:
+                    failures.append(f"{backend}, {attempt}: transactions came back as {static.to_dict('list')}")
+                if rules['Description'].astype(str).tolist() != ['Rent']:
+                    failures.append(f"{backend}, {attempt}: rules came back as {rules.to_dict('list')}")
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check Pulsar's fast recurrence and forecast paths against their plain versions.")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    rng = np.random.default_rng(args.seed)
+    now = datetime.now().replace(microsecond=0)
+
+    failures = check_rules(rng, now)
+    print(f"Rule expansion: {len(failures)} mismatches")
+    for failure in failures[:MAX_SHOWN]: print(f"  {failure}")
+
+    patch_failures = check_patches(rng, now)
+    print(f"Patched forecasts: {len(patch_failures)} mismatches over {PATCH_STEPS} edits")
+    for failure in patch_failures: print(f"  {failure}")
+
+    ledger_failures = check_new_ledgers()
+    print(f"New ledgers: {len(ledger_failures)} mismatches")
+    for failure in ledger_failures: print(f"  {failure}")
+    return 1 if failures or patch_failures or ledger_failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Command line front end for the Pulsar engine.
+
+Computes forecasts for any number of ledger folders in one run, without
+Tk or matplotlib ever being imported:
+
+    python pulsar_cli.py summary FOLDER [FOLDER ...] [--range "5 Years"] [--json] [--consolidated] [--jobs N]
+    python pulsar_cli.py import STATEMENT [STATEMENT ...] [--folder FOLDER] [--date-format %d/%m/%Y]
+    python pulsar_cli.py export OUTPUT.csv [--folder FOLDER] [--range "10 Years"] [--chunk-rows N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pulsar_engine import (Ledger, LedgerReadError, FORECAST_RANGES, STORAGE_BACKEND, BACKENDS, consolidate, default_data_folder, forecast_summary,
+                           project_ledgers, range_to_years)
+from pulsar_import import CHUNK_ROWS, READERS, StatementError, import_statement
+from pulsar_export import EXPORT_CHUNK_ROWS, WRITERS, export_forecast
+
+def summary_row(folder, p_text, summary, transactions, rules, projected_rows):
+    return {
+        'folder': folder,
+        'range': p_text,
+        'transactions': transactions,
+        'rules': rules,
+        'projected_rows': projected_rows,
+        'current_balance': round(summary['current_balance'], 2),
+        'final_balance': round(summary['final_balance'], 2),
+        'net_change': round(summary['net_change'], 2),
+        'lowest_balance': round(summary['lowest_balance'], 2),
+        'target_date': summary['target_date'].strftime('%Y-%m-%d'),
+    }
+
+def projection_path(projection_dir, folder):
+    name = os.path.basename(os.path.normpath(folder)) or 'ledger'
+    return os.path.join(projection_dir, f"{name}_projection.csv")
+
+def summarize_all(folders, p_text, backend=STORAGE_BACKEND, now=None, projection_dir=None, jobs=1, consolidated=False):
+    """Per-folder summary rows, plus one for all folders together if consolidated is set."""
+    years = range_to_years(p_text)
+    export_paths = None
+    if projection_dir:
+        os.makedirs(projection_dir, exist_ok=True)
+        export_paths = [projection_path(projection_dir, f) for f in folders]
+
+    results = project_ledgers(folders, years, backend, jobs, now, export_paths)
+    rows = [summary_row(r['folder'], p_text, r['summary'], r['transactions'], r['rules'], r['projected_rows']) for r in results]
+    if not consolidated: return rows, None
+    total = summary_row("All ledgers", p_text, forecast_summary(consolidate(results), years, now),
+                        sum(r['transactions'] for r in results), sum(r['rules'] for r in results), sum(r['projected_rows'] for r in results))
+    return rows, total
+
+def print_table(results):
+    cols = ['folder', 'transactions', 'rules', 'current_balance', 'final_balance', 'net_change', 'lowest_balance']
+    rows = [[str(r[c]) if not isinstance(r[c], float) else f"{r[c]:,.2f}" for c in cols] for r in results]
+    widths = [max(len(c), *(len(row[i]) for row in rows)) for i, c in enumerate(cols)]
+    print('  '.join(c.ljust(w) for c, w in zip(cols, widths)))
+    for row in rows:
+        print('  '.join(v.ljust(w) if i == 0 else v.rjust(w) for i, (v, w) in enumerate(zip(row, widths))))
+
+def cmd_summary(args):
+    folders = args.folders or [default_data_folder()]
+    missing = [f for f in folders if not os.path.isdir(f)]
+    if missing:
+        print(f"Not a ledger folder: {', '.join(missing)}", file=sys.stderr)
+        return 2
+
+    now = datetime.now()
+    rows, total = summarize_all(folders, args.range, args.backend, now, args.projection_dir, args.jobs, args.consolidated)
+    if args.json: print(json.dumps({'ledgers': rows, 'consolidated': total} if args.consolidated else rows, indent=2))
+    else: print_table(rows + ([total] if total else []))
+    return 0
+
+def cmd_import(args):
+    missing = [f for f in args.statements if not os.path.isfile(f)]
+    if missing:
+        print(f"No such file: {', '.join(missing)}", file=sys.stderr)
+        return 2
+
+    ledger = Ledger(args.folder or default_data_folder(), args.backend)
+    results = []
+    for path in args.statements:
+        try:
+            stats = import_statement(ledger, path, dry_run=args.dry_run, fmt=args.format,
+                                     date_format=args.date_format, chunk_size=args.chunk_size)
+        except StatementError as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            return 1
+        results.append(stats)
+        if not args.json:
+            verb = "Would import" if args.dry_run else "Imported"
+            print(f"{path}: {verb} {stats['imported']:,} rows ({stats['duplicates']:,} duplicates, {stats['skipped']:,} unreadable) "
+                  f"in {stats['seconds']:.2f}s, {stats['rows_per_sec']:,.0f} rows/sec [dates {stats['date_format']}]")
+    if args.json: print(json.dumps(results, indent=2))
+    return 0
+
+def cmd_export(args):
+    folder = args.folder or default_data_folder()
+    if not os.path.isdir(folder):
+        print(f"Not a ledger folder: {folder}", file=sys.stderr)
+        return 2
+
+    static, rules = Ledger(folder, args.backend).load()
+    start = time.perf_counter()
+    try:
+        rows = export_forecast(static, rules, range_to_years(args.range), args.output, args.format, args.chunk_rows)
+    except ImportError as e:
+        print(e, file=sys.stderr)
+        return 1
+    seconds = time.perf_counter() - start
+    print(f"{args.output}: {rows:,} rows in {seconds:.2f}s, {rows / max(seconds, 1e-9):,.0f} rows/sec")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='pulsar', description="Pulsar forecasting from the command line.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('summary', help="Projected balance summary for one or more ledger folders")
+    p.add_argument('folders', nargs='*', help="Ledger data folders (default: the app's own folder)")
+    p.add_argument('--range', default="1 Year", choices=FORECAST_RANGES, help="Forecast Range, as in the app")
+    p.add_argument('--backend', default=STORAGE_BACKEND, choices=sorted(BACKENDS), help="Storage format to read")
+    p.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    p.add_argument('--projection-dir', help="Also write each full projection to <dir>/<folder>_projection.csv")
+    p.add_argument('--consolidated', action='store_true', help="Add a combined forecast of all the folders")
+    p.add_argument('--jobs', type=int, default=0, help="Worker processes for projecting the folders (default: one per CPU)")
+    p.set_defaults(func=cmd_summary)
+
+    p = sub.add_parser('import', help="Bulk-import bank statement exports (CSV or OFX/QFX) into a ledger")
+    p.add_argument('statements', nargs='+', help="Statement files")
+    p.add_argument('--folder', help="Ledger data folder (default: the app's own folder)")
+    p.add_argument('--format', choices=sorted(READERS), help="File format (default: from the extension)")
+    p.add_argument('--date-format', help="strptime format of the CSV's dates, e.g. %%d/%%m/%%Y (default: detected)")
+    p.add_argument('--chunk-size', type=int, default=CHUNK_ROWS, help="Rows parsed per chunk")
+    p.add_argument('--backend', default=STORAGE_BACKEND, choices=sorted(BACKENDS), help="Storage format to write")
+    p.add_argument('--dry-run', action='store_true', help="Parse and check for duplicates without saving anything")
+    p.add_argument('--json', action='store_true', help="Print JSON instead of a line per file")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('export', help="Stream a ledger's full forecast to CSV or Parquet")
+    p.add_argument('output', help="Output file (.csv, or .parquet with pyarrow installed)")
+    p.add_argument('--folder', help="Ledger data folder (default: the app's own folder)")
+    p.add_argument('--range', default="1 Year", choices=FORECAST_RANGES, help="Forecast Range, as in the app")
+    p.add_argument('--format', choices=sorted(WRITERS), help="Output format (default: from the extension)")
+    p.add_argument('--chunk-rows', type=int, default=EXPORT_CHUNK_ROWS, help="Rows written per chunk")
+    p.add_argument('--backend', default=STORAGE_BACKEND, choices=sorted(BACKENDS), help="Storage format to read")
+    p.set_defaults(func=cmd_export)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except LedgerReadError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
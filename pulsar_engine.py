@@ -0,0 +1,1405 @@
+"""
+Pulsar's forecasting engine: ledger storage, recurrence expansion and projections.
+
+Nothing in here imports Tk or matplotlib, so the app, the command line tool and
+batch jobs can all use it. Every ledger is a data folder that is passed in explicitly.
+"""
+import pandas as pd
+import numpy as np
+import os
+import re
+import hashlib
+import math
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pandas.api.types import union_categoricals
+import pulsar_perf as perf
+
+# --- Configuration ---
+DATA_FOLDER = '💲NovaFoundry'
+TRANS_FILE = 'transactions.csv'
+RECUR_FILE = 'recurring_rules.csv'
+STORAGE_BACKEND = 'npz' # 'npz' (columnar binary) or 'csv'
+FORECAST_RANGES = ["3 Months", "6 Months", "1 Year", "2 Years", "5 Years", "10 Years"]
+MINOR_UNITS = 100 # Projections keep money as whole cents
+PROJECTION_DATE = 'datetime64[s]'
+
+def default_data_folder():
+    """Where the app keeps its ledger: %LOCALAPPDATA% on Windows, the XDG data folder elsewhere."""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, DATA_FOLDER)
+
+# --- Data Management ---
+
+STATIC_COLUMNS = ['Date', 'Description', 'Amount', 'Type']
+RULE_COLUMNS = ['StartDate', 'Description', 'Amount', 'Interval', 'Unit', 'EndDate']
+
+class LedgerReadError(Exception):
+    """A ledger file exists but couldn't be read. Raised instead of handing back an empty table, which the next write would save over the file."""
+    pass
+
+def read_error(path, e):
+    message = str(e).splitlines()[0] if str(e) else type(e).__name__ # pandas appends a paragraph of hints
+    return LedgerReadError(f"Couldn't read {os.path.basename(path)} in {os.path.dirname(path)}: {message}")
+
+def file_signature(path):
+    """(mtime, size) of a file, or None if it is missing."""
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+UMASK = os.umask(0); os.umask(UMASK) # Only readable by setting it, so once at import
+
+def atomic_write(path, write):
+    """
+    Full rewrites go to a temp file in the same folder which then replaces the
+    original, so a crash mid-write leaves either the old or the new file, never a truncated one.
+    The file keeps the original's permissions (mkstemp makes it owner-only), or gets the
+    usual ones for a new file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-', suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path): shutil.copymode(path, tmp_path)
+        else: os.chmod(tmp_path, 0o666 & ~UMASK)
+        os.replace(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+def normalize_static(df):
+    # ISO8601 takes both 'YYYY-MM-DD' and 'YYYY-MM-DD HH:MM:SS' in one column, as the app has always written them
+    df['Date'] = pd.to_datetime(df['Date'], format='ISO8601')
+    # Text as categories, same as the npz backend reads it, so both backends give the same compact frames
+    for col in ('Description', 'Type'):
+        df[col] = df[col].astype('category')
+    return df
+
+def normalize_rules(df):
+    df['StartDate'] = pd.to_datetime(df['StartDate'], format='ISO8601')
+    if 'EndDate' not in df.columns:
+        df['EndDate'] = pd.NaT
+    else:
+        df['EndDate'] = pd.to_datetime(df['EndDate'], format='ISO8601')
+    for col in ('Description', 'Unit'):
+        df[col] = df[col].astype('category')
+    return df
+
+# --- Storage Backends ---
+
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S' # Fixed, so an append of midnight-only rows doesn't switch formats mid-file
+
+class CsvBackend:
+    """The original plain-text format. Still used for export."""
+    name = 'csv'
+
+    def __init__(self, folder):
+        self.trans_path = os.path.join(folder, TRANS_FILE)
+        self.recur_path = os.path.join(folder, RECUR_FILE)
+
+    def exists(self):
+        return os.path.exists(self.trans_path) or os.path.exists(self.recur_path)
+
+    def init(self):
+        if not os.path.exists(self.trans_path):
+            pd.DataFrame(columns=STATIC_COLUMNS).to_csv(self.trans_path, index=False)
+        if not os.path.exists(self.recur_path):
+            pd.DataFrame(columns=RULE_COLUMNS).to_csv(self.recur_path, index=False)
+
+    def reset(self):
+        for path in (self.trans_path, self.recur_path):
+            if os.path.exists(path): os.remove(path)
+        self.init()
+
+    def static_signature(self): return file_signature(self.trans_path)
+    def rules_signature(self): return file_signature(self.recur_path)
+
+    def files(self):
+        """Every file holding ledger data."""
+        return [self.trans_path, self.recur_path]
+
+    @staticmethod
+    def _read(path, normalize, columns):
+        # Only a missing or empty file means "no rows"; anything else unreadable is an error
+        if not os.path.exists(path) or os.path.getsize(path) == 0: return pd.DataFrame(columns=columns)
+        try:
+            return normalize(pd.read_csv(path))
+        except Exception as e:
+            raise read_error(path, e) from e
+
+    def read_static(self):
+        return self._read(self.trans_path, normalize_static, STATIC_COLUMNS)
+
+    def read_rules(self):
+        return self._read(self.recur_path, normalize_rules, RULE_COLUMNS)
+
+    def _append(self, path, rows):
+        # One open + one write however many rows there are
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            rows.to_csv(path, mode='a', header=False, index=False, date_format=CSV_DATE_FORMAT)
+        else:
+            self._write(path, rows)
+
+    def _write(self, path, df):
+        atomic_write(path, lambda f: df.to_csv(f, index=False, date_format=CSV_DATE_FORMAT))
+
+    def append_static(self, rows, combined): self._append(self.trans_path, rows)
+    def write_static(self, df): self._write(self.trans_path, df)
+    def append_rules(self, rows, combined): self._append(self.recur_path, rows)
+    def write_rules(self, df): self._write(self.recur_path, df)
+
+class NpzBackend:
+    """
+    Columnar binary format: one uncompressed .npz per table with typed
+    datetime64/float64 columns and text stored as category codes, so loading
+    is a straight memory copy with no text or date parsing.
+    .npz has no in-place append, so appended rows go to small chunk files next to
+    the table (transactions.<generation>.<n>.npz) which are read after it, in order.
+    A full rewrite folds them back in. It bumps the generation stored in the table
+    first, so chunks a crash leaves behind from before it are ignored, then removed.
+    After MAX_CHUNKS appends the next one compacts the same way (or, for appends made
+    without the whole table in memory, the first one after them that has it).
+    """
+    name = 'npz'
+    STATIC_FILE = 'transactions.npz'
+    RECUR_FILE = 'recurring_rules.npz'
+    MAX_CHUNKS = 64
+    STATIC_SPEC = (['Date'], ['Amount'], ['Description', 'Type'], STATIC_COLUMNS)
+    RULES_SPEC = (['StartDate', 'EndDate'], ['Amount', 'Interval'], ['Description', 'Unit'], RULE_COLUMNS)
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.trans_path = os.path.join(folder, self.STATIC_FILE)
+        self.recur_path = os.path.join(folder, self.RECUR_FILE)
+        self.legacy = CsvBackend(folder)
+        self.generations = {} # Table path -> generation, once read or written
+
+    def exists(self):
+        return os.path.exists(self.trans_path) or os.path.exists(self.recur_path)
+
+    def init(self):
+        if not os.path.exists(self.trans_path):
+            self.write_static(pd.DataFrame(columns=STATIC_COLUMNS))
+        if not os.path.exists(self.recur_path):
+            self.write_rules(pd.DataFrame(columns=RULE_COLUMNS))
+
+    def reset(self):
+        # Also drop the CSVs left behind by the migration, so a reset really clears everything
+        chunks = [c for path in (self.trans_path, self.recur_path) for _, _, c in self._chunks(path)]
+        for path in [self.trans_path, self.recur_path, self.legacy.trans_path, self.legacy.recur_path] + chunks:
+            if os.path.exists(path): os.remove(path)
+        self.generations = {}
+        self.init()
+
+    def _chunks(self, path, generation=None):
+        """(generation, n, path) of the table's chunk files, in append order; only one generation's if given."""
+        pattern = re.compile(re.escape(os.path.splitext(os.path.basename(path))[0]) + r'\.(\d+)\.(\d+)\.npz$')
+        try: names = os.listdir(self.folder)
+        except OSError: return []
+        found = []
+        for name in names:
+            m = pattern.match(name)
+            if m and (generation is None or int(m.group(1)) == generation):
+                found.append((int(m.group(1)), int(m.group(2)), os.path.join(self.folder, name)))
+        return sorted(found)
+
+    def _signature(self, path):
+        return (file_signature(path),) + tuple((c, file_signature(c)) for _, _, c in self._chunks(path))
+
+    def static_signature(self): return self._signature(self.trans_path)
+    def rules_signature(self): return self._signature(self.recur_path)
+
+    def files(self):
+        """Every file holding ledger data."""
+        return [p for path in (self.trans_path, self.recur_path) for p in [path] + [c for _, _, c in self._chunks(path)]]
+
+    @staticmethod
+    def _encode_text(series):
+        codes, uniques = pd.factorize(series)
+        return codes.astype(np.int32), np.asarray([str(u) for u in uniques], dtype=str)
+
+    @staticmethod
+    def _decode_text(data, name):
+        # Always str categories: an empty table's array would otherwise come back as object and not union with the rest
+        return pd.Categorical.from_codes(data[name + '_codes'], categories=pd.Index(data[name + '_cats'], dtype=str))
+
+    def _arrays(self, df, spec):
+        date_cols, float_cols, text_cols, _ = spec
+        arrays = {}
+        for col in date_cols:
+            arrays[col] = pd.to_datetime(df[col]).to_numpy(dtype='datetime64[ns]')
+        for col in float_cols:
+            arrays[col] = pd.to_numeric(df[col]).to_numpy(dtype=np.float64)
+        for col in text_cols:
+            arrays[col + '_codes'], arrays[col + '_cats'] = self._encode_text(df[col])
+        return arrays
+
+    def _generation(self, path):
+        if path not in self.generations:
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    self.generations[path] = int(data['generation']) if 'generation' in data.files else 0
+            except Exception as e:
+                raise read_error(path, e) from e
+        return self.generations[path]
+
+    def _write(self, path, df, spec):
+        generation = self._generation(path) + 1 if os.path.exists(path) else 1
+        arrays = self._arrays(df, spec)
+        arrays['generation'] = np.int64(generation)
+        atomic_write(path, lambda f: np.savez(f, **arrays))
+        self.generations[path] = generation
+        for _, _, chunk in self._chunks(path): # All from older generations now
+            try: os.remove(chunk)
+            except OSError: pass # Ignored on read anyway; goes with the next rewrite
+
+    def _append(self, path, rows, combined, spec):
+        generation = self._generation(path)
+        chunks = self._chunks(path, generation)
+        if len(chunks) >= self.MAX_CHUNKS and combined is not None:
+            self._write(path, combined, spec); return
+        n = chunks[-1][1] + 1 if chunks else 1
+        stem = os.path.splitext(path)[0]
+        arrays = self._arrays(rows, spec)
+        atomic_write(f"{stem}.{generation}.{n}.npz", lambda f: np.savez(f, **arrays))
+
+    def _load(self, path, spec):
+        _, _, text_cols, columns = spec
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                cols = {}
+                for col in columns:
+                    if col in text_cols: cols[col] = self._decode_text(data, col)
+                    else: cols[col] = data[col]
+                generation = int(data['generation']) if 'generation' in data.files else 0
+            return pd.DataFrame(cols, columns=columns), generation
+        except Exception as e:
+            raise read_error(path, e) from e
+
+    def _read(self, path, spec):
+        if not os.path.exists(path): return pd.DataFrame(columns=spec[3])
+        df, generation = self._load(path, spec)
+        self.generations[path] = generation
+        parts = [self._load(chunk, spec)[0] for _, _, chunk in self._chunks(path, generation)]
+        if not parts: return df
+        try:
+            combined = pd.concat([df] + parts, ignore_index=True)
+            for col in spec[2]: # Each file has its own categories
+                combined[col] = union_categoricals([part[col] for part in [df] + parts])
+        except Exception as e:
+            raise read_error(path, e) from e
+        return combined
+
+    def read_static(self): return self._read(self.trans_path, self.STATIC_SPEC)
+    def read_rules(self): return self._read(self.recur_path, self.RULES_SPEC)
+    def write_static(self, df): self._write(self.trans_path, df, self.STATIC_SPEC)
+    def write_rules(self, df): self._write(self.recur_path, df, self.RULES_SPEC)
+    def append_static(self, rows, combined): self._append(self.trans_path, rows, combined, self.STATIC_SPEC)
+    def append_rules(self, rows, combined): self._append(self.recur_path, rows, combined, self.RULES_SPEC)
+
+BACKENDS = {'csv': CsvBackend, 'npz': NpzBackend}
+
+def open_backend(folder, kind=STORAGE_BACKEND):
+    """
+    Opens the storage backend for a data folder, migrating existing
+    transactions.csv / recurring_rules.csv into it the first time.
+    The CSV files are left in place as a backup. If they can't be read,
+    LedgerReadError is raised and nothing is written, so the next run tries again.
+    """
+    backend = BACKENDS[kind](folder)
+    if kind != 'csv' and not backend.exists() and backend.legacy.exists():
+        static, rules = backend.legacy.read_static(), backend.legacy.read_rules() # Both read before either is written
+        backend.write_static(static)
+        backend.write_rules(rules)
+    backend.init()
+    return backend
+
+def append_frame(base, rows):
+    """
+    pd.concat that keeps categorical text columns categorical. Goes column by column:
+    a frame-level concat turns categoricals with different categories into object
+    columns first, which on a big ledger costs far more than the append itself.
+    """
+    if base.empty: return rows.reset_index(drop=True)
+    cols = {}
+    for col in base.columns:
+        if isinstance(base[col].dtype, pd.CategoricalDtype):
+            cols[col] = union_categoricals([base[col], rows[col].astype('category')])
+        else:
+            cols[col] = pd.concat([base[col], rows[col]], ignore_index=True)
+    return pd.DataFrame(cols, columns=base.columns)
+
+class LedgerStore:
+    """
+    Keeps the parsed ledger (static transactions + recurring rules) in memory.
+    Mutations are applied to the in-memory frames and written through to the backend,
+    and a table is only read again when its file's mtime/size changed outside the app.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.static = None
+        self.rules = None
+        self.static_sig = None
+        self.rules_sig = None
+        self.reloads = 0
+        self.reloads_avoided = 0
+
+    def load(self):
+        sig = self.backend.static_signature()
+        if self.static is None or sig != self.static_sig:
+            with perf.span('read transactions') as s:
+                self.static = self.backend.read_static()
+                s.count(len(self.static))
+            self.static_sig = sig
+            self.reloads += 1
+        else:
+            self.reloads_avoided += 1
+
+        sig = self.backend.rules_signature()
+        if self.rules is None or sig != self.rules_sig:
+            with perf.span('read rules') as s:
+                self.rules = self.backend.read_rules()
+                s.count(len(self.rules))
+            self.rules_sig = sig
+            self.reloads += 1
+        else:
+            self.reloads_avoided += 1
+        return self.static, self.rules
+
+    # Static transactions
+    def append_static(self, rows):
+        self.load()
+        rows = normalize_static(rows[STATIC_COLUMNS].copy())
+        combined = append_frame(self.static, rows)
+        self.backend.append_static(rows, combined)
+        self.static = combined
+        self.static_sig = self.backend.static_signature()
+
+    def stream_static(self, rows):
+        """
+        Appends rows on disk only. The history in memory is let go rather than grown,
+        and read again on the next load, so a long series of these never holds it.
+        """
+        rows = normalize_static(rows[STATIC_COLUMNS].copy())
+        self.backend.append_static(rows, None)
+        self.static = self.static_sig = None
+
+    def delete_static(self, indices):
+        """Drops rows by DataFrame index. Returns how many were removed."""
+        self.load()
+        valid = [i for i in indices if i in self.static.index]
+        if valid:
+            # Re-number like a fresh read from disk would
+            self.static = self.static.drop(valid).reset_index(drop=True)
+            self.backend.write_static(self.static)
+            self.static_sig = self.backend.static_signature()
+        return len(valid)
+
+    # Recurring rules
+    def append_rule(self, rule):
+        self.load()
+        new_row = normalize_rules(pd.DataFrame([rule], columns=RULE_COLUMNS))
+        combined = append_frame(self.rules, new_row)
+        self.backend.append_rules(new_row, combined)
+        self.rules = combined
+        self.rules_sig = self.backend.rules_signature()
+
+    def update_rule(self, idx, rule):
+        self.load()
+        if not 0 <= idx < len(self.rules): return False
+        new_row = normalize_rules(pd.DataFrame([rule], columns=RULE_COLUMNS))
+
+        rules = self.rules.astype({'Description': object, 'Unit': object})
+        rules.loc[idx] = new_row.iloc[0]
+        rules = rules.astype({'Description': 'category', 'Unit': 'category'})
+        self.backend.write_rules(rules)
+        self.rules = rules
+        self.rules_sig = self.backend.rules_signature()
+        return True
+
+    def delete_rule(self, idx):
+        self.load()
+        self.rules = self.rules.drop(self.rules.index[idx]).reset_index(drop=True)
+        self.backend.write_rules(self.rules)
+        self.rules_sig = self.backend.rules_signature()
+
+    def reset(self):
+        self.backend.reset()
+        self.static = self.rules = None
+
+    def stats(self):
+        return {'backend': self.backend.name, 'reloads': self.reloads, 'reloads_avoided': self.reloads_avoided,
+                'static_rows': 0 if self.static is None else len(self.static),
+                'rules': 0 if self.rules is None else len(self.rules)}
+
+def add_interval(start_date, interval, unit):
+    """
+    Helper to add an interval (float supported) to a date.
+    Converts non-integer units to days if necessary.
+    """
+    try:
+        val = float(interval)
+    except:
+        val = 1.0
+
+    # If it's a clean integer, keep using standard logic for accuracy (especially months/years)
+    is_int = (val % 1 == 0)
+    
+    if unit == 'Days':
+        return start_date + timedelta(days=val)
+    elif unit == 'Weeks':
+        return start_date + timedelta(weeks=val)
+    elif unit == 'Months':
+        if is_int:
+            return start_date + relativedelta(months=int(val))
+        else:
+            # 0.5 months -> ~15.2 days
+            days = val * 30.437 
+            return start_date + timedelta(days=days)
+    elif unit == 'Years':
+        if is_int:
+            return start_date + relativedelta(years=int(val))
+        else:
+            days = val * 365.25
+            return start_date + timedelta(days=days)
+    return start_date
+
+# --- Recurrence Engine ---
+
+EMPTY_DATES = np.array([], dtype='datetime64[ns]')
+
+def to_datetime64(value):
+    """Converts a Timestamp/datetime/string to a numpy datetime64[ns] scalar."""
+    return pd.Timestamp(value).as_unit('ns').to_datetime64()
+
+def interval_step(interval, unit):
+    """
+    Works out how add_interval would advance a date for this rule.
+    Returns ('months', n) for whole calendar months/years (relativedelta),
+    ('fixed', timedelta64) for everything add_interval turns into a timedelta,
+    or (None, None) when the rule never moves forward.
+    """
+    try:
+        val = float(interval)
+    except:
+        val = 1.0
+    if not math.isfinite(val):
+        return None, None
+
+    is_int = (val % 1 == 0)
+
+    if unit == 'Days':
+        delta = timedelta(days=val)
+    elif unit == 'Weeks':
+        delta = timedelta(weeks=val)
+    elif unit == 'Months':
+        if is_int: return ('months', int(val)) if val > 0 else (None, None)
+        delta = timedelta(days=val * 30.437)
+    elif unit == 'Years':
+        if is_int: return ('months', 12 * int(val)) if val > 0 else (None, None)
+        delta = timedelta(days=val * 365.25)
+    else:
+        return None, None
+
+    # timedelta already rounded to microseconds, so this matches repeated addition exactly
+    step = np.timedelta64(delta, 'us').astype('timedelta64[ns]')
+    if step <= np.timedelta64(0, 'ns'):
+        return None, None
+    return 'fixed', step
+
+def _expand_months(start, months, cutoff):
+    """
+    Calendar month stepping, vectorized.
+    Repeatedly applying relativedelta clips the day to the month length and the clip
+    sticks (Jan 31 -> Feb 28 -> Mar 28), so each day is the running minimum of the
+    start day and the length of every month visited so far.
+    """
+    start_ts = pd.Timestamp(start)
+    cutoff_ts = pd.Timestamp(cutoff)
+    start_ym = start_ts.year * 12 + start_ts.month - 1
+    cutoff_ym = cutoff_ts.year * 12 + cutoff_ts.month - 1
+    count = (cutoff_ym - start_ym) // months + 1
+    if count <= 0: return EMPTY_DATES
+
+    month_idx = start_ym + months * np.arange(count, dtype=np.int64)
+    month_start = (month_idx - 1970 * 12).astype('datetime64[M]')
+    month_len = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(np.int64)
+    month_len[0] = start_ts.day
+    days = np.minimum.accumulate(month_len)
+
+    time_of_day = start - start.astype('datetime64[D]')
+    dates = month_start.astype('datetime64[D]') + (days - 1) + time_of_day
+    dates = dates.astype('datetime64[ns]')
+    return dates[:np.searchsorted(dates, cutoff, side='right')]
+
+def expand_rule(start_date, interval, unit, cutoff_date):
+    """
+    Returns every occurrence of a rule from start_date up to and including cutoff_date
+    as a sorted datetime64[ns] array. Gives the same dates as stepping with add_interval.
+    Rules that would never advance (zero/negative interval, unknown unit) yield only their start date.
+    """
+    if pd.isnull(start_date) or pd.isnull(cutoff_date): return EMPTY_DATES
+    start = to_datetime64(start_date)
+    cutoff = to_datetime64(cutoff_date)
+    if start > cutoff: return EMPTY_DATES
+
+    kind, step = interval_step(interval, unit)
+    if kind == 'months':
+        return _expand_months(start, step, cutoff)
+    if kind == 'fixed':
+        count = (cutoff - start) // step + 1
+        return start + np.arange(count, dtype=np.int64) * step
+    return np.array([start], dtype='datetime64[ns]')
+
+class OccurrenceIterator:
+    """
+    One rule's occurrences in order, a batch at a time: the same dates as expand_rule
+    (as datetime64[s]), without ever holding more than one batch of them.
+    """
+    BATCH = 4096
+
+    def __init__(self, start_date, interval, unit, cutoff_date):
+        self.buffer = EMPTY_DATES.astype(PROJECTION_DATE)
+        self.done = pd.isnull(start_date) or pd.isnull(cutoff_date)
+        if self.done: return
+        self.start = to_datetime64(start_date)
+        self.cutoff = to_datetime64(cutoff_date)
+        self.kind, self.step = interval_step(interval, unit)
+        self.done = self.start > self.cutoff
+        self.k = 0 # Occurrences generated so far
+        if self.kind == 'fixed':
+            self.count = (self.cutoff - self.start) // self.step + 1
+        elif self.kind == 'months':
+            ts, cutoff_ts = pd.Timestamp(self.start), pd.Timestamp(self.cutoff)
+            self.month = ts.year * 12 + ts.month - 1
+            self.count = (cutoff_ts.year * 12 + cutoff_ts.month - 1 - self.month) // self.step + 1
+            self.clip = ts.day # Day-of-month clipping sticks, see _expand_months
+            self.time_of_day = self.start - self.start.astype('datetime64[D]')
+        else:
+            self.count = 1 # Never advances: just the start
+
+    def _fill(self):
+        k = np.arange(self.k, min(self.k + self.BATCH, self.count), dtype=np.int64)
+        if self.kind == 'fixed':
+            dates = self.start + k * self.step
+        elif self.kind == 'months':
+            month_idx = self.month + self.step * k
+            month_start = (month_idx - 1970 * 12).astype('datetime64[M]')
+            month_len = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(np.int64)
+            days = np.minimum.accumulate(np.minimum(month_len, self.clip))
+            self.clip = int(days[-1])
+            dates = (month_start.astype('datetime64[D]') + (days - 1) + self.time_of_day).astype('datetime64[ns]')
+        else:
+            dates = np.array([self.start], dtype='datetime64[ns]')
+        self.k += len(k)
+        if self.k >= self.count: self.done = True
+        # The last month can still land after the cutoff (on a later day or time)
+        dates = dates[:np.searchsorted(dates, self.cutoff, side='right')]
+        self.buffer = np.concatenate([self.buffer, dates.astype(PROJECTION_DATE)])
+
+    def peek(self):
+        """The next occurrence, or None once the rule has run out."""
+        while not len(self.buffer) and not self.done: self._fill()
+        return self.buffer[0] if len(self.buffer) else None
+
+    def take_before(self, end):
+        """Removes and returns every remaining occurrence dated before end (a datetime64[s])."""
+        while not self.done and (not len(self.buffer) or self.buffer[-1] < end): self._fill()
+        n = int(np.searchsorted(self.buffer, end, side='left'))
+        taken, self.buffer = self.buffer[:n], self.buffer[n:]
+        return taken
+
+def rule_cutoff(rule_end, limit):
+    """Same cutoff the projection loop used: the rule's EndDate, capped at limit."""
+    if pd.isnull(rule_end): return limit
+    return min(limit, rule_end)
+
+# --- Projection Cache ---
+
+PROJECTION_CACHE_SIZE = 2048 # Max number of rules kept, at least; see ProjectionCache.reserve
+
+class ProjectionCache:
+    """
+    LRU cache of per-rule occurrence arrays, keyed on the rule's contents.
+    Each entry remembers the cutoff it was expanded to, so a longer horizon only
+    expands the missing tail and a shorter one just slices the cached array.
+    Editing a rule changes its key, so only that rule is recomputed.
+    """
+    def __init__(self, max_rules=PROJECTION_CACHE_SIZE):
+        self.min_rules = max_rules
+        self.max_rules = max_rules
+        self.entries = OrderedDict() # key -> [dates, cutoff]
+        self.lock = threading.Lock() # Projections may run on worker threads
+        self.hits = 0
+        self.misses = 0
+        self.extends = 0
+        self.evictions = 0
+
+    def reserve(self, n_rules):
+        """
+        Makes room for a projection over n_rules rules. Every projection walks the rules in
+        the same order, so an LRU smaller than that evicts exactly the entry needed next and
+        never hits; twice the rule count also leaves room for the old versions of edited rules.
+        """
+        with self.lock:
+            self.max_rules = max(self.min_rules, 2 * n_rules)
+            while len(self.entries) > self.max_rules:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    @staticmethod
+    def rule_key(rule):
+        end = None if pd.isnull(rule.EndDate) else to_datetime64(rule.EndDate)
+        start = None if pd.isnull(rule.StartDate) else to_datetime64(rule.StartDate)
+        return (start, float(rule.Amount), str(rule.Interval), rule.Unit, end)
+
+    def occurrences(self, rule, cutoff_date):
+        """Occurrences of rule (a df_rules row tuple) up to cutoff_date, same as expand_rule."""
+        with self.lock:
+            return self._occurrences(rule, cutoff_date)
+
+    def _occurrences(self, rule, cutoff_date):
+        key = self.rule_key(rule)
+        cutoff = to_datetime64(cutoff_date)
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            entry = [expand_rule(rule.StartDate, rule.Interval, rule.Unit, cutoff), cutoff]
+            self.entries[key] = entry
+            if len(self.entries) > self.max_rules:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.entries.move_to_end(key)
+            if cutoff <= entry[1]:
+                self.hits += 1
+            else:
+                self.extends += 1
+                self._extend(entry, rule, cutoff)
+
+        dates = entry[0]
+        if cutoff < entry[1]:
+            return dates[:np.searchsorted(dates, cutoff, side='right')]
+        return dates
+
+    def _extend(self, entry, rule, cutoff):
+        dates = entry[0]
+        if len(dates) == 0:
+            tail = expand_rule(rule.StartDate, rule.Interval, rule.Unit, cutoff)
+        elif interval_step(rule.Interval, rule.Unit)[0] is None:
+            tail = EMPTY_DATES
+        else:
+            # add_interval only looks at the current date, so stepping on from the last one continues the series
+            next_date = add_interval(pd.Timestamp(dates[-1]), rule.Interval, rule.Unit)
+            tail = expand_rule(next_date, rule.Interval, rule.Unit, cutoff)
+        if len(tail): entry[0] = np.concatenate([dates, tail])
+        entry[1] = cutoff
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {'rules': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'extends': self.extends, 'evictions': self.evictions}
+
+projection_cache = ProjectionCache()
+
+class ProjectionCancelled(Exception):
+    pass
+
+def check_cancel(cancel):
+    if cancel is not None and cancel.is_set(): raise ProjectionCancelled()
+
+def to_minor(amounts):
+    """Currency amounts as int64 minor units (cents), rounded to the nearest one. Missing amounts count as 0."""
+    return np.rint(np.nan_to_num(np.asarray(amounts, dtype=np.float64)) * MINOR_UNITS).astype(np.int64)
+
+def merge_order(dates):
+    """
+    Stable merge order for a concatenation of sorted runs (the history, then each
+    rule's occurrences): the permutation that sorts dates, with ties kept in
+    concatenation order. numpy's stable argsort is a timsort, which detects the
+    runs and merges them pairwise (O(n log k) for k runs), so this is the k-way
+    merge without a Python-level heap. An unsorted run (history added out of
+    order) still comes out right; it just costs a sort of that run.
+    """
+    if np.isnat(dates).any(): return np.argsort(dates, kind='stable') # NaT sorts last, as in pandas
+    return np.argsort(dates.view(np.int64), kind='stable') # Same order, a bit faster than datetime64
+
+def compute_projection(static, rules, years=1.0, cancel=None, sources=False, now=None):
+    """
+    Builds the projection frame (history + recurring occurrences merged by date, with a running Balance).
+    Rows on the same date (to the second) keep history first, then rules in rule order.
+    The frame is stored compact and is meant to be read through its .forecast accessor:
+    Date is datetime64[s], Amount and Balance are int64 cents, Description/Type are
+    categorical and Recurring is bool.
+    With sources=True it returns (projection, rule_ids): the rules row each projected row
+    came from, -1 for history.
+    Doesn't touch any globals, so it can run off the main thread; if the cancel
+    Event gets set it stops at the next checkpoint and raises ProjectionCancelled.
+    The horizon runs years from now (default: the current time).
+    """
+    end_date = (now or datetime.now()) + timedelta(days=365 * years)
+
+    date_arrays = []
+    with perf.span('expand rules') as s:
+        if not rules.empty:
+            projection_cache.reserve(len(rules))
+            for rule in rules.itertuples(index=False):
+                check_cancel(cancel)
+                cutoff_date = rule_cutoff(rule.EndDate, end_date)
+                date_arrays.append(projection_cache.occurrences(rule, cutoff_date))
+        s.count(sum(len(d) for d in date_arrays))
+
+    static_dates = static['Date'].to_numpy(dtype='datetime64[ns]') if not static.empty else EMPTY_DATES
+    n_static = len(static_dates)
+    counts = [len(d) for d in date_arrays]
+    n_rules = sum(counts)
+    if n_static + n_rules == 0:
+        projection = pd.DataFrame(columns=['Date', 'Description', 'Amount', 'Balance', 'Recurring'])
+        return (projection, np.array([], dtype=np.int32)) if sources else projection
+
+    check_cancel(cancel)
+    with perf.span('merge') as s:
+        # Whole seconds are plenty for a ledger, and the cast happens in the same pass as the concatenation
+        dates = np.concatenate([static_dates] + date_arrays, dtype=PROJECTION_DATE, casting='same_kind')
+        order = merge_order(dates)
+        s.count(len(order))
+
+    check_cancel(cancel)
+    with perf.span('assemble') as s:
+        # Every column is built in concatenated order and gathered once by the merge order.
+        # Text columns stay categorical, so that gather only moves integer codes.
+        amounts = np.empty(n_static + n_rules, dtype=np.int64)
+        if n_static: amounts[:n_static] = to_minor(static['Amount'])
+        if n_rules: amounts[n_static:] = np.repeat(to_minor(rules['Amount']), counts)
+
+        parts = ([pd.Categorical(static['Description'])] if n_static else []) + ([pd.Categorical(rules['Description'])] if n_rules else [])
+        descs = union_categoricals(parts) if len(parts) > 1 else parts[0]
+        codes = descs.codes
+        if n_rules: codes = np.concatenate([codes[:n_static], np.repeat(codes[n_static:], counts)])
+
+        columns = {'Date': dates[order],
+                   'Description': pd.Categorical.from_codes(codes[order], categories=descs.categories),
+                   'Amount': amounts[order]}
+        if n_static:
+            # Only history rows have a Type, same as when the frames used to be concatenated
+            types = pd.Categorical(static['Type'])
+            type_codes = np.full(n_static + n_rules, -1, dtype=types.codes.dtype)
+            type_codes[:n_static] = types.codes
+            columns['Type'] = pd.Categorical.from_codes(type_codes[order], categories=types.categories)
+        columns['Recurring'] = order >= n_static
+        columns['Balance'] = np.cumsum(columns['Amount']) # Integer cents, so no drift however many rows
+        projection = pd.DataFrame(columns, copy=False) # Arrays are all fresh, no need to copy them again
+        s.count(len(projection))
+    if not sources: return projection
+    rule_ids = np.full(n_static + n_rules, -1, dtype=np.int32)
+    if n_rules: rule_ids[n_static:] = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+    return projection, rule_ids[order]
+
+@pd.api.extensions.register_dataframe_accessor('forecast')
+class ForecastAccessor:
+    """
+    projection.forecast: how everything outside this module reads a projection,
+    so nothing else needs to know that money is stored as cents.
+    """
+    def __init__(self, projection):
+        self._df = projection
+
+    @property
+    def dates(self):
+        return self._df['Date'].to_numpy(dtype=PROJECTION_DATE)
+
+    @property
+    def amounts_minor(self):
+        return self._df['Amount'].to_numpy(dtype=np.int64)
+
+    @property
+    def balances_minor(self):
+        return self._df['Balance'].to_numpy(dtype=np.int64)
+
+    @property
+    def amounts(self):
+        return self.amounts_minor / MINOR_UNITS
+
+    @property
+    def balances(self):
+        return self.balances_minor / MINOR_UNITS
+
+    @property
+    def recurring(self):
+        return self._df['Recurring'].to_numpy(dtype=bool)
+
+    def descriptions(self):
+        """(codes, names): one code per row into a table of distinct names, -1 where there's none."""
+        desc = self._df['Description']
+        if isinstance(desc.dtype, pd.CategoricalDtype):
+            return desc.cat.codes.to_numpy(), desc.cat.categories.to_numpy()
+        return pd.factorize(desc)
+
+    def export(self):
+        """The projection as plain values (amounts in currency units), for writing out."""
+        df = self._df.copy()
+        if df.empty: return df
+        df['Amount'] = self.amounts
+        df['Balance'] = self.balances
+        return df
+
+# --- Forecasting ---
+
+def range_to_years(p_text):
+    """Turns a Forecast Range label ("6 Months", "2 Years") into years."""
+    if "Month" in p_text:
+        months = int(p_text.split()[0])
+        return months / 12.0
+    try: return int(p_text.split()[0])
+    except: return 1
+
+ROLLUP_LEVELS = ('month', 'week', 'day') # Coarsest first
+
+class Rollup:
+    """
+    One row per day, week (from Monday) or month that has any projection rows in it:
+    the positions of its first and last row, the balance after its first row, and its
+    closing, lowest and highest balance and net change (all cents). Zoomed-out views
+    draw from these instead of from every transaction.
+    """
+    PERIOD_DAYS = {'day': 1.0, 'week': 7.0, 'month': 31.0} # Longest a bucket can span
+
+    def __init__(self, level, ids, first, last, open_, close, low, high, net):
+        self.level = level
+        self.ids, self.first, self.last = ids, first, last
+        self.open, self.close, self.low, self.high, self.net = open_, close, low, high, net
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def bucket_ids(dates, level):
+        if level == 'month': return dates.astype('datetime64[M]').view(np.int64)
+        days = dates.astype('datetime64[D]').view(np.int64)
+        if level == 'week': return (days + 3) // 7 # 1970-01-01 was a Thursday
+        return days
+
+    @classmethod
+    def build(cls, level, dates, balances, offset=0, opening=0):
+        """Buckets for sorted dates/balances in one pass; offset/opening say where in the projection that slice starts."""
+        n = len(dates)
+        if n == 0:
+            empty = np.array([], dtype=np.int64)
+            return cls(level, empty, empty, empty, empty, empty, empty, empty, empty)
+        ids = cls.bucket_ids(dates, level)
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        ends = np.r_[starts[1:], n] - 1
+        close = balances[ends]
+        return cls(level, ids[starts], starts + offset, ends + offset, balances[starts], close,
+                   np.minimum.reduceat(balances, starts), np.maximum.reduceat(balances, starts),
+                   close - np.r_[opening, close[:-1]])
+
+    def patched(self, index, changed_from):
+        """
+        This rollup for index, a patched copy of the projection it was built from in which
+        nothing before changed_from moved: buckets before it are kept, the rest are rebuilt.
+        """
+        k = int(np.searchsorted(self.ids, self.bucket_ids(np.array([to_datetime64(changed_from)]), self.level)[0]))
+        cut = int(self.last[k - 1]) + 1 if k else 0
+        tail = Rollup.build(self.level, index.dates[cut:], index.balances[cut:], cut, index.balances[cut - 1] if cut else 0)
+        return Rollup(self.level, *(np.concatenate([getattr(self, name)[:k], getattr(tail, name)])
+                                    for name in ('ids', 'first', 'last', 'open', 'close', 'low', 'high', 'net')))
+
+    def buckets_in(self, lo, hi):
+        """Bucket positions [b0, b1) covering the projection rows [lo, hi)."""
+        return int(np.searchsorted(self.last, lo, side='left')), int(np.searchsorted(self.first, hi, side='left'))
+
+class BalanceIndex:
+    """
+    Read-only balance lookups over a projection: its sorted dates and running balances
+    (in cents, like the projection; every lookup hands back currency units).
+    Balance at a date and net change are a searchsorted each (O(log n)). Min/max over
+    a range use a sparse table over fixed-size blocks: O(n) to build, and each query
+    looks at two table entries plus at most two partial blocks.
+    """
+    BLOCK = 64
+
+    def __init__(self, dates, balances):
+        # NaT dates sort last; leave them out so first/last dates and lookups only see real rows
+        n = len(dates) - int(np.count_nonzero(np.isnat(dates)))
+        self.dates = dates[:n]
+        self.balances = balances[:n]
+        self._rollups = None
+
+        starts = np.arange(0, n, self.BLOCK)
+        blocks = len(starts)
+        # Level j holds the min/max of 2**j consecutive blocks starting at each block
+        self.min_table = [np.minimum.reduceat(self.balances, starts) if n else np.array([])]
+        self.max_table = [np.maximum.reduceat(self.balances, starts) if n else np.array([])]
+        width = 1
+        while 2 * width <= blocks:
+            self.min_table.append(np.minimum(self.min_table[-1][:-width], self.min_table[-1][width:]))
+            self.max_table.append(np.maximum(self.max_table[-1][:-width], self.max_table[-1][width:]))
+            width *= 2
+
+    @classmethod
+    def from_projection(cls, projection):
+        if projection.empty: return cls(EMPTY_DATES.astype(PROJECTION_DATE), np.array([], dtype=np.int64))
+        return cls(projection.forecast.dates, projection.forecast.balances_minor)
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def first_date(self):
+        return pd.Timestamp(self.dates[0]) if len(self.dates) else None
+
+    @property
+    def last_date(self):
+        return pd.Timestamp(self.dates[-1]) if len(self.dates) else None
+
+    def _key(self, date):
+        # In the dates' own unit; a mixed-unit searchsorted would convert the whole array first
+        return to_datetime64(date).astype(self.dates.dtype)
+
+    def span(self, start, end):
+        """Positions [lo, hi) of the rows dated start <= Date <= end."""
+        lo = int(np.searchsorted(self.dates, self._key(start), side='left'))
+        hi = int(np.searchsorted(self.dates, self._key(end), side='right'))
+        return lo, max(lo, hi)
+
+    def _balance_minor(self, date):
+        pos = int(np.searchsorted(self.dates, self._key(date), side='right'))
+        return int(self.balances[pos - 1]) if pos else 0
+
+    def balance_at(self, date):
+        """Balance after every row dated on or before date (0 before the first row)."""
+        return self._balance_minor(date) / MINOR_UNITS
+
+    def net_change(self, start, end):
+        """balance_at(end) - balance_at(start), taken in cents so it has no float noise."""
+        return (self._balance_minor(end) - self._balance_minor(start)) / MINOR_UNITS
+
+    def min_max(self, lo, hi):
+        """(min, max) balance over positions [lo, hi), or None if that's empty."""
+        lo, hi = max(0, int(lo)), min(len(self.balances), int(hi))
+        if hi <= lo: return None
+        if hi - lo <= 2 * self.BLOCK:
+            part = self.balances[lo:hi]
+            return int(part.min()) / MINOR_UNITS, int(part.max()) / MINOR_UNITS
+
+        # Partial blocks at both ends, whole blocks in between from the table
+        b0, b1 = -(-lo // self.BLOCK), hi // self.BLOCK
+        level = (b1 - b0).bit_length() - 1
+        width = 1 << level
+        head = self.balances[lo:b0 * self.BLOCK]
+        tail = self.balances[b1 * self.BLOCK:hi]
+        low = min(self.min_table[level][b0], self.min_table[level][b1 - width])
+        high = max(self.max_table[level][b0], self.max_table[level][b1 - width])
+        if len(head): low, high = min(low, head.min()), max(high, head.max())
+        if len(tail): low, high = min(low, tail.min()), max(high, tail.max())
+        return int(low) / MINOR_UNITS, int(high) / MINOR_UNITS
+
+    def range_min_max(self, start, end):
+        """(min, max) balance over the rows dated start <= Date <= end, or None if there are none."""
+        return self.min_max(*self.span(start, end))
+
+    @property
+    def rollups(self):
+        """{level: Rollup}, built on first use (the app does it on its projection thread)."""
+        if self._rollups is None:
+            self._rollups = {level: Rollup.build(level, self.dates, self.balances) for level in ROLLUP_LEVELS}
+        return self._rollups
+
+    def carry_rollups(self, old, changed_from):
+        """Takes over old's rollups for this patched copy of its projection, redoing only the buckets from changed_from on."""
+        if old._rollups is not None:
+            self._rollups = {level: rollup.patched(self, changed_from) for level, rollup in old._rollups.items()}
+
+    def rollup_for(self, bucket_days, lo, hi):
+        """
+        The coarsest rollup whose buckets are no wider than bucket_days (so it still resolves
+        a view drawn at that many days per pixel) and which has fewer points than the raw
+        rows [lo, hi) would; None means drawing the rows themselves is as cheap.
+        """
+        for level in ROLLUP_LEVELS:
+            if Rollup.PERIOD_DAYS[level] > bucket_days: continue
+            rollup = self.rollups[level]
+            b0, b1 = rollup.buckets_in(lo, hi)
+            return rollup if 4 * (b1 - b0) < hi - lo else None
+        return None
+
+def forecast_summary(index, years, now=None):
+    """Balance today, projected balance at the end of the horizon, the change between them and the lowest point on the way."""
+    now = now or datetime.now()
+    target_date = now + timedelta(days=365*years)
+
+    current_bal = index.balance_at(now)
+    final_bal = index.balance_at(target_date)
+    ahead = index.range_min_max(now, target_date)
+
+    return {'current_balance': current_bal, 'final_balance': final_bal,
+            'net_change': index.net_change(now, target_date), 'target_date': target_date,
+            'lowest_balance': min(current_bal, ahead[0]) if ahead else current_bal}
+
+# --- Incremental Updates ---
+
+def _patchable(projection):
+    # Built by compute_projection with some history in it (so it has a Type column and categorical text)
+    return (not projection.empty and 'Type' in projection.columns
+            and isinstance(projection['Description'].dtype, pd.CategoricalDtype)
+            and isinstance(projection['Type'].dtype, pd.CategoricalDtype))
+
+def _rebalance(amounts, balances, start):
+    """Recomputes the running balance from position start on, in place. Integer cents, so it's exactly what a full cumsum gives."""
+    if start >= len(amounts): return
+    np.cumsum(amounts[start:], out=balances[start:])
+    if start: balances[start:] += balances[start - 1]
+
+def _patched_frame(projection, dates, desc_codes, desc_cats, amounts, type_codes, recurring, balances):
+    projection = pd.DataFrame({
+        'Date': dates,
+        'Description': pd.Categorical.from_codes(desc_codes, categories=desc_cats),
+        'Amount': amounts,
+        'Type': pd.Categorical.from_codes(type_codes, categories=projection['Type'].cat.categories),
+        'Recurring': recurring,
+        'Balance': balances,
+    }, copy=False)
+    return projection, BalanceIndex.from_projection(projection)
+
+def insert_static_row(projection, date, desc, amount):
+    """
+    Adds one history row to a projection without rebuilding it: the row goes where a full
+    compute_projection would put it (after the other history on that date, before the rules),
+    and the balances after it are recomputed. Returns (projection, index, date of the change),
+    or None if this projection can't be patched and needs a full rebuild.
+    """
+    if not _patchable(projection): return None
+    date = to_datetime64(date).astype(PROJECTION_DATE)
+    if np.isnat(date): return None
+    dates = projection.forecast.dates
+    recurring = projection.forecast.recurring
+    lo = int(np.searchsorted(dates, date, side='left'))
+    hi = int(np.searchsorted(dates, date, side='right'))
+    pos = lo + int(np.count_nonzero(~recurring[lo:hi]))
+
+    descs = projection['Description'].cat
+    if desc not in descs.categories: descs = descs.add_categories([desc]).cat
+    types = projection['Type'].cat
+    if 'Static' not in types.categories: return None
+
+    amounts = np.insert(projection.forecast.amounts_minor, pos, to_minor(amount))
+    balances = np.insert(projection.forecast.balances_minor, pos, 0)
+    _rebalance(amounts, balances, pos)
+    projection, index = _patched_frame(projection,
+        np.insert(dates, pos, date),
+        np.insert(descs.codes.to_numpy(), pos, descs.categories.get_loc(desc)), descs.categories,
+        amounts,
+        np.insert(types.codes.to_numpy(), pos, types.categories.get_loc('Static')),
+        np.insert(recurring, pos, False),
+        balances)
+    return projection, index, pd.Timestamp(date)
+
+def remove_static_rows(projection, rows):
+    """
+    Removes history rows (given as the static frame rows that were deleted) from a projection
+    without rebuilding it. Returns (projection, index, date of the earliest change), or None
+    if a row can't be found or the projection can't be patched.
+    """
+    if not _patchable(projection): return None
+    if rows.empty: return None
+    dates = projection.forecast.dates
+    recurring = projection.forecast.recurring
+    amounts = projection.forecast.amounts_minor
+    descs = projection['Description'].cat
+    codes = descs.codes.to_numpy()
+
+    drop = set()
+    for row in rows.itertuples(index=False):
+        date = to_datetime64(row.Date).astype(PROJECTION_DATE)
+        if np.isnat(date) or row.Description not in descs.categories: return None
+        code = descs.categories.get_loc(row.Description)
+        lo = int(np.searchsorted(dates, date, side='left'))
+        hi = int(np.searchsorted(dates, date, side='right'))
+        # Any history row with the same values will do; identical rows are interchangeable
+        hits = np.flatnonzero(~recurring[lo:hi] & (codes[lo:hi] == code) & (amounts[lo:hi] == to_minor(row.Amount))) + lo
+        hits = [h for h in hits if h not in drop]
+        if not hits: return None
+        drop.add(hits[0])
+
+    drop = np.array(sorted(drop))
+    first = int(drop[0])
+    new_amounts = np.delete(amounts, drop)
+    balances = np.delete(projection.forecast.balances_minor, drop)
+    _rebalance(new_amounts, balances, first)
+    projection, index = _patched_frame(projection,
+        np.delete(dates, drop),
+        np.delete(codes, drop), descs.categories,
+        new_amounts,
+        np.delete(projection['Type'].cat.codes.to_numpy(), drop),
+        np.delete(recurring, drop),
+        balances)
+    return projection, index, pd.Timestamp(dates[first])
+
+def clean_amount(amount_str):
+    clean = re.sub(r'[^\d.-]', '', amount_str)
+    return float(clean)
+
+def clean_amounts(values):
+    """
+    clean_amount for a whole column at once: currency symbols, spaces and thousands
+    separators are dropped, and (12.50) accounting-style amounts count as negative.
+    Anything that still isn't a number comes back as NaN instead of raising.
+    """
+    values = pd.Series(values, copy=False)
+    if pd.api.types.is_numeric_dtype(values): return values.astype(np.float64)
+    # The string work is done once per distinct value; statements repeat amounts a lot
+    codes, uniques = pd.factorize(values)
+    text = pd.Series(uniques, dtype=str).str.strip()
+    negative = (text.str.startswith('(') & text.str.endswith(')')).to_numpy(dtype=bool)
+    amounts = pd.to_numeric(text.str.replace(r'[^\d.-]', '', regex=True), errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    amounts[negative] = -np.abs(amounts[negative])
+    amounts = np.append(amounts, np.nan) # Code -1 (missing) picks the trailing NaN
+    return pd.Series(amounts[codes], index=values.index)
+
+# --- Ledger ---
+
+class Ledger:
+    """One data folder: its store plus the operations the app performs on it."""
+    def __init__(self, folder, backend=STORAGE_BACKEND):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.store = LedgerStore(open_backend(folder, backend))
+        self.snapshot = ProjectionSnapshot(self.store.backend, folder)
+
+    def load(self):
+        return self.store.load()
+
+    def project(self, years=1.0, cancel=None):
+        static, rules = self.load()
+        return compute_projection(static, rules, years, cancel)
+
+    def save_static(self, date, desc, amount):
+        self.save_static_rows([date], [desc], [amount])
+
+    def save_static_rows(self, dates, descs, amounts):
+        """Bulk version of save_static: all rows go to disk in a single write."""
+        if len(dates) == 0: return
+        self.store.append_static(pd.DataFrame({'Date': dates, 'Description': descs, 'Amount': amounts, 'Type': 'Static'}))
+
+    def stream_static_rows(self, dates, descs, amounts):
+        """save_static_rows for batches written one after another: they go to disk only (see LedgerStore.stream_static)."""
+        if len(dates) == 0: return
+        self.store.stream_static(pd.DataFrame({'Date': dates, 'Description': descs, 'Amount': amounts, 'Type': 'Static'}))
+
+    def save_rule(self, start_date, desc, amount, interval, unit, end_date=None, index_to_overwrite=None):
+        new_data = {
+            'StartDate': start_date, 
+            'Description': desc, 
+            'Amount': amount, 
+            'Interval': float(interval), # Ensure stored as float/number
+            'Unit': unit,
+            'EndDate': end_date
+        }
+        
+        if index_to_overwrite is not None:
+            self.store.update_rule(index_to_overwrite, new_data)
+        else:
+            self.store.append_rule(new_data)
+
+    def archive_rule(self, idx, now=None):
+        """Stops a rule, saving its past occurrences to history."""
+        _, rules = self.load()
+        rule = rules.iloc[idx]
+        archive_limit = rule_cutoff(rule['EndDate'], now or datetime.now())
+
+        occurrences = expand_rule(rule['StartDate'], rule['Interval'], rule['Unit'], archive_limit)
+        n = len(occurrences)
+        # History is written before the rule is removed, so a crash in between can't lose past occurrences
+        self.save_static_rows(occurrences, [f"{rule['Description']} (Archived)"] * n, np.full(n, float(rule['Amount'])))
+        self.store.delete_rule(idx)
+
+# --- Saved Projections ---
+
+SNAPSHOT_FOLDER = 'projection_cache'
+SNAPSHOT_KEEP = 3 # Most recently used snapshots kept, so flipping between a few ranges keeps hitting
+SNAPSHOT_STALE_TMP = 10 * 60 # Seconds before a leftover temp file (from a save that died) is removed
+
+def restore_projection(static, rules, dates, amounts, balances, rule_ids):
+    """
+    Rebuilds the frame compute_projection made from its stored arrays, with descriptions and
+    types filled back in from the ledger it was projected from. Returns None if the arrays
+    don't fit that ledger.
+    """
+    n = len(dates)
+    if n == 0 or not len(amounts) == len(balances) == len(rule_ids) == n: return None
+    history = rule_ids < 0
+    n_static = int(np.count_nonzero(history))
+    if n_static != len(static) or (n_static < n and int(rule_ids.max()) >= len(rules)): return None
+
+    # History comes out of the merge in its own merge order, so the same permutation finds each row's ledger row
+    static_order = merge_order(static['Date'].to_numpy(dtype='datetime64[ns]').astype(PROJECTION_DATE)) if n_static else None
+    parts = ([pd.Categorical(static['Description'])] if n_static else []) + ([pd.Categorical(rules['Description'])] if n_static < n else [])
+    descs = union_categoricals(parts) if len(parts) > 1 else parts[0]
+    codes = np.empty(n, dtype=descs.codes.dtype)
+    if n_static: codes[history] = descs.codes[:n_static][static_order]
+    if n_static < n: codes[~history] = descs.codes[n_static:][rule_ids[~history]]
+
+    columns = {'Date': dates, 'Description': pd.Categorical.from_codes(codes, categories=descs.categories), 'Amount': amounts}
+    if n_static:
+        types = pd.Categorical(static['Type'])
+        type_codes = np.full(n, -1, dtype=types.codes.dtype)
+        type_codes[history] = types.codes[static_order]
+        columns['Type'] = pd.Categorical.from_codes(type_codes, categories=types.categories)
+    columns['Recurring'] = ~history
+    columns['Balance'] = balances
+    return pd.DataFrame(columns, copy=False)
+
+class ProjectionSnapshot:
+    """
+    The last projection of a data folder, kept on disk as plain .npy arrays (dates, amounts,
+    balances and rule ids) that the next launch memory-maps instead of projecting again.
+    Files are named after a key: a checksum of both ledger files, the horizon and today's
+    date, so any edit, a different range or a new day simply misses and nothing ever has to
+    be invalidated. (Within a day the horizon end moves with the clock; like a forecast left
+    open on screen, that is ignored.) Each snapshot gets new file names, so a file that is
+    still mapped (Windows won't replace one) never needs overwriting. The last few snapshots
+    used are kept, so switching the range back and forth doesn't project and save every time.
+    """
+    VERSION = 1 # Bump when the stored layout changes
+    ARRAYS = ('dates', 'amounts', 'balances', 'rule_ids')
+
+    def __init__(self, backend, folder):
+        self.backend = backend
+        self.folder = os.path.join(folder, SNAPSHOT_FOLDER)
+        self.checksums = {} # path -> (file signature, checksum)
+        self.hits = 0
+        self.misses = 0
+
+    def _checksum(self, path):
+        """Content hash of a ledger file; only read again when its mtime/size changed."""
+        sig = file_signature(path)
+        cached = self.checksums.get(path)
+        if cached is not None and cached[0] == sig: return cached[1]
+        h = hashlib.blake2b(digest_size=16)
+        if sig is not None:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''): h.update(block)
+        self.checksums[path] = (sig, h.hexdigest())
+        return h.hexdigest()
+
+    def key(self, years, now=None):
+        """Names the projection of the ledger as it is on disk now, over years, for today."""
+        now = now or datetime.now()
+        parts = [str(self.VERSION), self.backend.name] + [f"{os.path.basename(p)}={self._checksum(p)}" for p in self.backend.files()]
+        parts += [repr(float(years)), now.strftime('%Y-%m-%d')]
+        return hashlib.blake2b('|'.join(parts).encode(), digest_size=10).hexdigest()
+
+    def _path(self, key, name):
+        return os.path.join(self.folder, f"{key}-{name}.npy")
+
+    def load(self, key, static, rules):
+        """
+        The saved projection for key as (projection, rule_ids), or None if there isn't one.
+        static/rules must be the ledger the key was taken from. The arrays are mapped rather
+        than read, so this takes about the same time however long the forecast is.
+        """
+        try:
+            arrays = {name: np.load(self._path(key, name), mmap_mode='r', allow_pickle=False) for name in self.ARRAYS}
+            projection = restore_projection(static, rules, **arrays)
+        except (OSError, ValueError):
+            projection = None
+        if projection is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try: os.utime(self._path(key, 'dates')) # Marks it as recently used for prune
+        except OSError: pass
+        return projection, arrays['rule_ids']
+
+    def save(self, key, projection, rule_ids):
+        """Saves a projection and its rule ids (from compute_projection) under key, then drops older snapshots."""
+        if projection.empty: return
+        os.makedirs(self.folder, exist_ok=True)
+        arrays = {'dates': projection.forecast.dates, 'amounts': projection.forecast.amounts_minor,
+                  'balances': projection.forecast.balances_minor, 'rule_ids': np.asarray(rule_ids, dtype=np.int32)}
+        # Each file is replaced atomically; a snapshot missing any of them just doesn't load
+        for name in self.ARRAYS:
+            atomic_write(self._path(key, name), lambda f, a=arrays[name]: np.save(f, np.ascontiguousarray(a)))
+        self.prune(keep=key)
+
+    def prune(self, keep=None):
+        """Drops all but the SNAPSHOT_KEEP most recently used snapshots (always keeping keep), and stale temp files."""
+        if not os.path.isdir(self.folder): return
+        now = datetime.now().timestamp()
+        files = {} # key -> [(path, mtime)]
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try: mtime = os.path.getmtime(path)
+            except OSError: continue
+            if name.startswith('.tmp-'):
+                # Recent ones may be another save still writing
+                if now - mtime > SNAPSHOT_STALE_TMP: files.setdefault(None, []).append((path, mtime))
+                continue
+            files.setdefault(name.split('-', 1)[0], []).append((path, mtime))
+        stale = files.pop(None, [])
+        recent = sorted(files, key=lambda k: (k == keep, max(m for _, m in files[k])), reverse=True)
+        for key in recent[SNAPSHOT_KEEP:]: stale += files[key]
+        for path, _ in stale:
+            try: os.remove(path)
+            except OSError: pass # Still mapped somewhere; it goes next time
+
+# --- Multi-Ledger ---
+
+def project_folder(folder, years, backend=STORAGE_BACKEND, now=None, export_path=None):
+    """
+    Loads and projects one ledger folder and returns its forecast summary plus the projection
+    as plain arrays (dates as datetime64[s], amounts in cents). This is what each worker
+    process of project_ledgers runs, so only those arrays and a small dict get sent back.
+    Uses and refreshes the folder's projection cache, like the app does.
+    """
+    now = now or datetime.now() # One reference time for the cache key, the projection and the summary
+    ledger = Ledger(folder, backend)
+    static, rules = ledger.load()
+    key = ledger.snapshot.key(years, now)
+    cached = ledger.snapshot.load(key, static, rules)
+    if cached is not None: projection = cached[0]
+    else:
+        projection, rule_ids = compute_projection(static, rules, years, sources=True, now=now)
+        try: ledger.snapshot.save(key, projection, rule_ids)
+        except OSError: pass
+    index = BalanceIndex.from_projection(projection)
+    if export_path: projection.forecast.export().to_csv(export_path, index=False)
+    return {'folder': folder, 'transactions': len(static), 'rules': len(rules), 'projected_rows': len(projection),
+            'summary': forecast_summary(index, years, now),
+            'dates': index.dates, 'amounts': projection.forecast.amounts_minor[:len(index)]} # Rows without a date are left out
+
+def project_ledgers(folders, years, backend=STORAGE_BACKEND, jobs=None, now=None, export_paths=None):
+    """
+    project_folder for every folder, spread over jobs worker processes (default: one per CPU).
+    Workers share nothing: each reads and projects its own ledger. Results come back in folder order.
+    """
+    now = now or datetime.now()
+    export_paths = export_paths or [None] * len(folders)
+    jobs = min(jobs or os.cpu_count() or 1, len(folders))
+    if jobs <= 1:
+        return [project_folder(f, years, backend, now, path) for f, path in zip(folders, export_paths)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(project_folder, folders, repeat(years), repeat(backend), repeat(now), export_paths))
+
+def consolidate(results):
+    """One BalanceIndex over several ledgers (results from project_ledgers): all their rows merged by date, with one running balance."""
+    if not results: return BalanceIndex(EMPTY_DATES.astype(PROJECTION_DATE), np.array([], dtype=np.int64))
+    dates = np.concatenate([r['dates'] for r in results])
+    amounts = np.concatenate([r['amounts'] for r in results])
+    order = merge_order(dates)
+    return BalanceIndex(dates[order], np.cumsum(amounts[order]))
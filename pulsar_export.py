@@ -0,0 +1,189 @@
+"""
+Streaming forecast export.
+
+The forecast is produced a time window at a time: history rows for the window,
+plus each rule's occurrences pulled from its OccurrenceIterator, merged in the
+same order compute_projection uses, with the running balance carried from one
+window to the next. Rows go out in fixed-size chunks, so memory stays flat
+however long the horizon or however many daily rules there are.
+
+    export_forecast(static, rules, 10, 'forecast.csv')
+"""
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pulsar_perf as perf
+from pulsar_engine import MINOR_UNITS, PROJECTION_DATE, OccurrenceIterator, merge_order, rule_cutoff, to_minor
+
+# --- Configuration ---
+EXPORT_CHUNK_ROWS = 100_000
+WINDOW_DAYS = 31 # First window; later ones grow or shrink to hold about a chunk of rows
+MAX_WINDOW_DAYS = 3660
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet'}
+
+# --- Forecast Stream ---
+
+def _sorted_history(static):
+    """History as (dates[s], descriptions, cents, types) in date order; ledger order kept within a date."""
+    dates = static['Date'].to_numpy(dtype='datetime64[ns]').astype(PROJECTION_DATE)
+    order = merge_order(dates)
+    return (dates[order], static['Description'].to_numpy(dtype=object)[order],
+            to_minor(static['Amount'])[order], static['Type'].to_numpy(dtype=object)[order])
+
+def iter_forecast_windows(static, rules, years=1.0, target_rows=EXPORT_CHUNK_ROWS):
+    """
+    Yields the forecast as frames of consecutive rows, one per time window that has any
+    rows, with the same rows, order and balances as compute_projection. Amounts and
+    balances are in currency units, like projection.forecast.export().
+    """
+    end_date = datetime.now() + timedelta(days=365 * years)
+    h_dates, h_descs, h_amounts, h_types = _sorted_history(static) if not static.empty else (
+        np.array([], dtype=PROJECTION_DATE), np.array([], dtype=object), np.array([], dtype=np.int64), np.array([], dtype=object))
+    h_pos = 0
+    # NaT history sorts last and is written after everything else, as compute_projection does
+    n_dated = len(h_dates) - int(np.count_nonzero(np.isnat(h_dates)))
+
+    iterators, r_descs, r_amounts = [], [], []
+    if not rules.empty:
+        for rule in rules.itertuples(index=False):
+            iterators.append(OccurrenceIterator(rule.StartDate, rule.Interval, rule.Unit, rule_cutoff(rule.EndDate, end_date)))
+            r_descs.append(rule.Description)
+            r_amounts.append(rule.Amount)
+    r_amounts = to_minor(r_amounts) if r_amounts else np.array([], dtype=np.int64)
+    has_type = not static.empty
+    window_days = WINDOW_DAYS
+    balance = 0
+
+    while True:
+        pending = [d for d in (it.peek() for it in iterators) if d is not None]
+        if h_pos < n_dated: pending.append(h_dates[h_pos])
+        if not pending: break
+        # Windows start at the next row, so gaps (old history, sparse rules) are skipped outright
+        window_end = min(pending) + np.timedelta64(window_days, 'D')
+
+        h_end = h_pos + int(np.searchsorted(h_dates[h_pos:n_dated], window_end, side='left'))
+        occurrences = [it.take_before(window_end) for it in iterators]
+        counts = [len(o) for o in occurrences]
+        dates = np.concatenate([h_dates[h_pos:h_end]] + occurrences)
+        n_static = h_end - h_pos
+        order = merge_order(dates)
+        rule_of = np.repeat(np.arange(len(iterators)), counts)
+
+        descs = np.concatenate([h_descs[h_pos:h_end], np.asarray(r_descs, dtype=object)[rule_of]])
+        amounts = np.concatenate([h_amounts[h_pos:h_end], r_amounts[rule_of]])[order]
+        balances = np.cumsum(amounts) + balance
+        balance = int(balances[-1])
+        frame = {'Date': dates[order], 'Description': descs[order], 'Amount': amounts / MINOR_UNITS}
+        if has_type:
+            types = np.concatenate([h_types[h_pos:h_end], np.full(len(rule_of), np.nan, dtype=object)])
+            frame['Type'] = types[order]
+        frame['Recurring'] = order >= n_static
+        frame['Balance'] = balances / MINOR_UNITS
+        h_pos = h_end
+        if len(order) < target_rows // 2: window_days = min(window_days * 2, MAX_WINDOW_DAYS)
+        elif len(order) > target_rows * 2: window_days = max(window_days // 2, 1)
+        yield pd.DataFrame(frame)
+
+    if n_dated < len(h_dates):
+        amounts = h_amounts[n_dated:]
+        frame = {'Date': h_dates[n_dated:], 'Description': h_descs[n_dated:], 'Amount': amounts / MINOR_UNITS,
+                 'Type': h_types[n_dated:], 'Recurring': np.zeros(len(amounts), dtype=bool),
+                 'Balance': (np.cumsum(amounts) + balance) / MINOR_UNITS}
+        yield pd.DataFrame(frame)
+
+def iter_forecast_chunks(static, rules, years=1.0, chunk_rows=EXPORT_CHUNK_ROWS):
+    """iter_forecast_windows regrouped into frames of exactly chunk_rows rows (the last one may be shorter)."""
+    pending, size = [], 0
+    for frame in iter_forecast_windows(static, rules, years, chunk_rows):
+        pending.append(frame)
+        size += len(frame)
+        while size >= chunk_rows:
+            block = pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+            yield block.iloc[:chunk_rows].reset_index(drop=True)
+            rest = block.iloc[chunk_rows:]
+            pending, size = ([rest] if len(rest) else []), len(rest)
+    if size:
+        yield pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0].reset_index(drop=True)
+
+# --- Writers ---
+
+def has_times(static, rules):
+    """True if any date in the ledger has a time of day (pandas then writes times for every row)."""
+    for frame, col in ((static, 'Date'), (rules, 'StartDate')):
+        if frame.empty: continue
+        dates = frame[col].to_numpy(dtype='datetime64[ns]')
+        dates = dates[~np.isnat(dates)]
+        if (dates != dates.astype('datetime64[D]')).any(): return True
+    return False
+
+class CsvWriter:
+    """
+    Every chunk uses the same date format, picked from the whole ledger up front. Left to
+    itself to_csv would decide per chunk, and a chunk of midnight-only rows would drop
+    the times the rest of the file has.
+    """
+    def __init__(self, path, times=True):
+        self.f = open(path, 'w', newline='', encoding='utf-8')
+        self.header = True
+        self.date_format = '%Y-%m-%d %H:%M:%S' if times else '%Y-%m-%d'
+
+    def write(self, chunk):
+        chunk.to_csv(self.f, header=self.header, index=False, date_format=self.date_format)
+        self.header = False
+
+    def close(self):
+        self.f.close()
+
+class ParquetWriter:
+    """Needs pyarrow, which is optional; one row group per chunk."""
+    def __init__(self, path, times=True):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs the pyarrow package (pip install pyarrow), or export as .csv instead")
+        self.pa = pa
+        self.path = path
+        self.pq = pq
+        self.writer = None
+
+    def write(self, chunk):
+        pa = self.pa
+        if self.writer is None:
+            fields = [('Date', pa.timestamp('s')), ('Description', pa.string()), ('Amount', pa.float64())]
+            if 'Type' in chunk.columns: fields.append(('Type', pa.string()))
+            fields += [('Recurring', pa.bool_()), ('Balance', pa.float64())]
+            self.schema = pa.schema(fields)
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None: self.writer.close()
+
+WRITERS = {'csv': CsvWriter, 'parquet': ParquetWriter}
+
+def export_format(path):
+    return FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+def export_forecast(static, rules, years, path, fmt=None, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """
+    Streams the forecast for static/rules over years into path (CSV, or Parquet if pyarrow
+    is installed), a chunk at a time. progress(rows written) is called after every chunk.
+    Returns the number of rows written. A failed export doesn't leave a partial file behind.
+    """
+    writer = WRITERS[fmt or export_format(path)](path, has_times(static, rules))
+    rows = 0
+    try:
+        for chunk in iter_forecast_chunks(static, rules, years, chunk_rows):
+            with perf.span('export chunk') as s:
+                writer.write(chunk)
+                s.count(len(chunk))
+            rows += len(chunk)
+            if progress is not None: progress(rows)
+    except:
+        writer.close()
+        if os.path.exists(path): os.remove(path)
+        raise
+    writer.close()
+    return rows
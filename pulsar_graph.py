@@ -0,0 +1,259 @@
+"""
+Pulsar's balance graph: level-of-detail reduction, label layout and the persistent-artist renderer.
+
+Only needs matplotlib's core (no pyplot, no GUI backend), so the app can import it
+after the window is up and it can render headless onto any Figure.
+"""
+import numpy as np
+from datetime import datetime
+import matplotlib.dates as mdates
+from matplotlib.colors import ListedColormap, BoundaryNorm
+from matplotlib.collections import LineCollection
+from pulsar_engine import BalanceIndex, MINOR_UNITS
+
+# --- Configuration ---
+MAX_GRAPH_LABELS = 40 # Most annotations drawn at once; overlapping ones are dropped
+LABEL_FONT_SIZE = 7
+
+# --- Graph Rendering ---
+
+def m4_indices(x, y, origin, bucket_width):
+    """
+    M4 level-of-detail reduction: splits sorted x into buckets of bucket_width
+    (one per pixel column) and keeps the first, last, min and max point of each.
+    Drawing just those points gives the same pixels as drawing the full series,
+    and since min/max survive, any zero crossing inside a bucket survives too.
+    Returns the sorted indices to keep.
+    """
+    n = len(x)
+    if n == 0: return np.arange(0)
+    bucket = np.floor((x - origin) / bucket_width).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    if 4 * len(starts) >= n: return np.arange(n)
+    ends = np.r_[starts[1:], n] - 1
+
+    bucket_of = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    keep = [starts, ends]
+    for reduce in (np.minimum, np.maximum):
+        extreme = reduce.reduceat(y, starts)
+        hits = np.flatnonzero(y == extreme[bucket_of])
+        # First hit per bucket (hits are in index order, so buckets are non-decreasing)
+        first = np.r_[True, bucket_of[hits][1:] != bucket_of[hits][:-1]]
+        keep.append(hits[first])
+    return np.unique(np.concatenate(keep))
+
+
+def layout_labels(px, py, widths, height, budget):
+    """
+    Greedy label placement in pixel space. Candidates come in priority order;
+    each is kept if its box doesn't overlap a label already kept, until budget is reached.
+    Returns the positions (into the inputs) of the kept labels.
+    """
+    kept = []
+    kx = np.empty(budget); ky = np.empty(budget); kw = np.empty(budget)
+    for i in range(len(px)):
+        n = len(kept)
+        if n and np.any((np.abs(kx[:n] - px[i]) * 2 < kw[:n] + widths[i]) & (np.abs(ky[:n] - py[i]) < height)):
+            continue
+        kx[n], ky[n], kw[n] = px[i], py[i], widths[i]
+        kept.append(i)
+        if len(kept) >= budget: break
+    return np.array(kept, dtype=np.int64)
+
+class BalanceGraph:
+    """
+    Owns the balance graph's artists and keeps them between redraws.
+    set_data() rebuilds the line, fills and markers only when the projection changed;
+    update_data() swaps in a patched projection and keeps them;
+    set_view() just moves the axis limits and refreshes the in-view scatter and labels.
+    """
+    def __init__(self, fig, ax):
+        self.fig = fig
+        self.ax = ax
+        self.data_key = object()
+        self.has_data = False
+        self.scatter = None
+        self.now_line = None
+        self.labels = []
+        self.line = None
+        self.fills = []
+        self.lod_window = None # (start, end, bucket width) the line was last decimated for
+
+    def _style(self):
+        ax = self.ax
+        ax.set_facecolor('#2b2b2b')
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+        ax.tick_params(colors='#aaaaaa', labelsize=9)
+        for s in ax.spines.values(): s.set_edgecolor('#404040')
+        ax.grid(True, color='#404040', alpha=0.3)
+
+    def set_data(self, df, key, index=None):
+        """Rebuilds every artist from df (and its BalanceIndex, built here if not given). Skipped if key matches the last call."""
+        if key == self.data_key: return False
+        self.data_key = key
+        ax = self.ax
+        ax.clear()
+        self.labels = []
+        self._style()
+        self._load_arrays(df, index)
+        if not self.has_data: return True
+
+        cmap = ListedColormap(['#ff3333', '#2cc985'])
+        norm = BoundaryNorm([-float('inf'), 0, float('inf')], cmap.N)
+        self.line = LineCollection([], cmap=cmap, norm=norm)
+        self.line.set_linewidth(2)
+        ax.add_collection(self.line)
+        self.fills = []
+        self.lod_window = None
+
+        self.scatter = ax.scatter([], [], color='#aaaaaa', s=10, zorder=3, alpha=0.6)
+        self.now_line = ax.axvline(x=mdates.date2num(datetime.now()), color='white', linestyle=':', linewidth=1.5, alpha=0.7)
+        return True
+
+    def update_data(self, df, key, index, changed_from):
+        """
+        Takes a projection that only changed from changed_from onwards (a patched-in history row).
+        Artists are kept; the decimated line is only redone if the change reaches into its window.
+        """
+        if key == self.data_key: return False
+        if not self.has_data or not len(index): return self.set_data(df, key, index)
+        self.data_key = key
+        self._load_arrays(df, index)
+        if self.lod_window is not None and mdates.date2num(changed_from) <= self.lod_window[1]:
+            self.lod_window = None
+        return True
+
+    def _load_arrays(self, df, index):
+        self.index = index if index is not None else BalanceIndex.from_projection(df)
+        self.has_data = len(self.index) > 0
+        if not self.has_data: return
+
+        n = len(self.index) # Rows without a date aren't plotted
+        self.dates = self.index.dates
+        self.dates_num = mdates.date2num(self.dates)
+        self.balances = df.forecast.balances[:n]
+        # Descriptions as codes into a table of names; -1 (missing) picks the trailing "nan"
+        codes, names = df.forecast.descriptions()
+        self.desc_names = np.array([str(name) for name in names] + ['nan'])
+        self.desc_codes = codes[:n]
+        self.label_len = np.char.str_len(self.desc_names)[self.desc_codes]
+        self.amounts = df.forecast.amounts[:n]
+
+    def _update_line(self, x0, x1):
+        """
+        (Re)decimates the line and fills for the view [x0, x1] at one bucket per pixel column.
+        Covers one extra view-width on each side, so scrolling only redoes this
+        once the view leaves that window or the zoom/canvas width changes.
+        """
+        span = x1 - x0
+        bucket_width = span / self._width_px()
+        if self.lod_window is not None:
+            w0, w1, w_bucket = self.lod_window
+            if w0 <= x0 and x1 <= w1 and abs(w_bucket - bucket_width) <= 1e-9 * max(1.0, abs(bucket_width)):
+                return
+        w0, w1 = x0 - span, x1 + span
+        self.lod_window = (w0, w1, bucket_width)
+
+        # One extra point either side so the line runs off the edges of the window
+        lo = max(np.searchsorted(self.dates_num, w0, side='left') - 1, 0)
+        hi = min(np.searchsorted(self.dates_num, w1, side='right') + 1, len(self.dates_num))
+        rollup = self.index.rollup_for(bucket_width, lo, hi)
+        if rollup is None:
+            keep = m4_indices(self.dates_num[lo:hi], self.balances[lo:hi], w0, bucket_width) + lo
+            x, y = self.dates_num[keep], self.balances[keep]
+        else:
+            # Buckets no wider than a pixel column stand in for their rows; M4 then works on those points
+            x, y = self._rollup_points(rollup, lo, hi)
+            keep = m4_indices(x, y, w0, bucket_width)
+            x, y = x[keep], y[keep]
+
+        points = np.column_stack([x, y]).reshape(-1, 1, 2)
+        self.line.set_segments(np.concatenate([points[:-1], points[1:]], axis=1))
+        self.line.set_array(np.diff(y))
+
+        for fill in self.fills: fill.remove()
+        # interpolate=True closes each fill exactly at the zero crossing between kept points
+        self.fills = [
+            self.ax.fill_between(x, y, 0, where=(y>=0), interpolate=True, color='#2cc985', alpha=0.1),
+            self.ax.fill_between(x, y, 0, where=(y<0), interpolate=True, color='#ff3333', alpha=0.1),
+        ]
+
+    def _width_px(self):
+        return max(1, int(self.ax.get_window_extent().width))
+
+    def _rollup_points(self, rollup, lo, hi):
+        """
+        Four points per bucket covering rows [lo, hi): its first row, its low and high
+        (halfway through, in the order the bucket moved) and its close.
+        """
+        b0, b1 = rollup.buckets_in(lo, hi)
+        x_first, x_last = self.dates_num[rollup.first[b0:b1]], self.dates_num[rollup.last[b0:b1]]
+        x_mid = (x_first + x_last) / 2
+        rising = rollup.close[b0:b1] >= rollup.open[b0:b1]
+        low, high = rollup.low[b0:b1], rollup.high[b0:b1]
+        x = np.column_stack([x_first, x_mid, x_mid, x_last]).ravel()
+        y = np.column_stack([rollup.open[b0:b1], np.where(rising, low, high), np.where(rising, high, low), rollup.close[b0:b1]]).ravel()
+        return x, y / MINOR_UNITS
+
+    def set_view(self, view_start_date, view_end_date, ylabel):
+        ax = self.ax
+        ax.set_ylabel(ylabel, color='#aaaaaa')
+        for label in self.labels: label.remove()
+        self.labels = []
+        if not self.has_data: return
+
+        now_num = mdates.date2num(datetime.now())
+        self.now_line.set_xdata([now_num, now_num])
+
+        lo, hi = self.index.span(view_start_date, view_end_date)
+        x0, x1 = mdates.date2num(view_start_date), mdates.date2num(view_end_date)
+        # Zoomed out, one marker per day/week/month (at its closing balance) instead of one per row
+        rollup = self.index.rollup_for((x1 - x0) / self._width_px(), lo, hi)
+        if rollup is None:
+            x, y = self.dates_num[lo:hi], self.balances[lo:hi]
+        else:
+            b0, b1 = rollup.buckets_in(lo, hi)
+            x, y = self.dates_num[rollup.last[b0:b1]], rollup.close[b0:b1] / MINOR_UNITS
+        self.scatter.set_offsets(np.column_stack([x, y]))
+
+        ax.set_xlim(x0, x1)
+        self._update_line(x0, x1)
+        if hi > lo:
+            y_min, y_max = self.index.min_max(lo, hi)
+            margin = (y_max - y_min) * 0.1 if y_max != y_min else 100
+            ax.set_ylim(y_min - margin, y_max + margin)
+        else:
+            ax.set_ylim(*self.index.min_max(0, len(self.index)))
+
+        # Labels are laid out last, once the limits (and so the pixel positions) are final
+        for i in self._pick_labels(lo, hi):
+            self.labels.append(ax.annotate(self.desc_names[self.desc_codes[i]],
+                        (self.dates_num[i], self.balances[i]),
+                        xytext=(0, 10 if i % 2 == 0 else -15), 
+                        textcoords='offset points',
+                        fontsize=LABEL_FONT_SIZE, color='#888888', ha='center',
+                        arrowprops=dict(arrowstyle="-", color='#444444', lw=0.5)))
+        self.fig.autofmt_xdate()
+
+    def _pick_labels(self, lo, hi):
+        """Indices (into df_display) of the in-view points that get a label."""
+        if hi <= lo or MAX_GRAPH_LABELS <= 0: return []
+        idx = np.arange(lo, hi)
+        codes = self.desc_codes[lo:hi]
+
+        # First occurrence of each description in view, then the biggest amounts
+        first_of_series = np.zeros(len(idx), dtype=bool)
+        first_of_series[np.unique(codes, return_index=True)[1]] = True
+        order = np.lexsort((-np.abs(self.amounts[lo:hi]), ~first_of_series))
+        # Overlap culling only ever needs to look at a few times the budget
+        order = order[:MAX_GRAPH_LABELS * 8]
+        idx = idx[order]
+
+        px_per_pt = self.fig.dpi / 72.0
+        anchors = self.ax.transData.transform(np.column_stack([self.dates_num[idx], self.balances[idx]]))
+        offsets = np.where(idx % 2 == 0, 10.0, -15.0) * px_per_pt
+        widths = self.label_len[idx] * LABEL_FONT_SIZE * 0.6 * px_per_pt
+        height = LABEL_FONT_SIZE * 1.3 * px_per_pt
+
+        keep = layout_labels(anchors[:, 0], anchors[:, 1] + offsets, widths, height, MAX_GRAPH_LABELS)
+        return idx[keep]
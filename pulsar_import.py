@@ -0,0 +1,264 @@
+"""
+Bulk import of bank statement exports (CSV, or OFX/QFX) into a ledger.
+
+The file is read in fixed-size chunks, so even a multi-GB export only ever has
+one chunk of raw text in memory. Dates are parsed with one explicit format for the
+whole file instead of guessing per row, and rows already in the ledger are dropped
+through a hash index. import_statement appends each chunk's new rows to the ledger
+files as soon as they're found, so its memory doesn't grow with the statement;
+prepare_import on its own collects them (in compact form) for one save at the end,
+which is what the app does, since its history is in memory anyway.
+
+    stats = import_statement(ledger, 'statement.csv')
+"""
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import pulsar_perf as perf
+from pulsar_engine import clean_amounts, to_minor
+
+# --- Configuration ---
+CHUNK_ROWS = 100_000
+OFX_READ_CHARS = 1 << 20
+DEFAULT_DESCRIPTION = "Imported"
+
+# Tried in this order against the first chunk; pass date_format to skip the guessing
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y/%m/%d',
+    '%m/%d/%Y', '%d/%m/%Y', '%m/%d/%y', '%d/%m/%y', '%d.%m.%Y', '%d-%m-%Y',
+    '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y', '%Y%m%d',
+]
+
+# Header names banks commonly use, matched case-insensitively
+DATE_HEADERS = ['date', 'transaction date', 'posted date', 'posting date', 'booking date', 'value date', 'startdate']
+DESC_HEADERS = ['description', 'payee', 'name', 'memo', 'details', 'narrative', 'merchant', 'reference']
+AMOUNT_HEADERS = ['amount', 'transaction amount', 'value']
+DEBIT_HEADERS = ['debit', 'withdrawal', 'withdrawals', 'money out', 'paid out']
+CREDIT_HEADERS = ['credit', 'deposit', 'deposits', 'money in', 'paid in']
+
+class StatementError(ValueError):
+    pass
+
+def detect_format(path):
+    return 'ofx' if os.path.splitext(path)[1].lower() in ('.ofx', '.qfx') else 'csv'
+
+def detect_date_format(values):
+    """The first of DATE_FORMATS that parses the most of values (a sample of one column)."""
+    sample = pd.Series(values, dtype=str).dropna().str.strip()
+    sample = sample[sample != ''].head(1000)
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = int(pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum())
+        if count > best_count: best, best_count = fmt, count
+        if count == len(sample): break
+    if best is None: raise StatementError("Couldn't work out the date format; pass it explicitly (e.g. %d/%m/%Y)")
+    return best
+
+def parse_dates(values, date_format):
+    """Dates parsed with one explicit format (NaT where it doesn't fit), once per distinct string."""
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=str).str.strip(), format=date_format, errors='coerce')
+    return np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT'))[codes] # Code -1 (missing) is NaT
+
+def clean_descriptions(values):
+    codes, uniques = pd.factorize(values)
+    names = pd.Series(uniques, dtype=str).str.strip()
+    names = names.where(names != '', DEFAULT_DESCRIPTION).to_numpy(dtype=object)
+    return np.append(names, DEFAULT_DESCRIPTION)[codes]
+
+def _pick(headers, names):
+    lookup = {h.strip().lower(): h for h in headers}
+    for name in names:
+        if name in lookup: return lookup[name]
+    return None
+
+def map_columns(headers):
+    """Which CSV columns hold the date, description and amount (or debit/credit)."""
+    cols = {'date': _pick(headers, DATE_HEADERS), 'description': _pick(headers, DESC_HEADERS),
+            'amount': _pick(headers, AMOUNT_HEADERS), 'debit': _pick(headers, DEBIT_HEADERS), 'credit': _pick(headers, CREDIT_HEADERS)}
+    if cols['date'] is None: raise StatementError(f"No date column found in: {', '.join(headers)}")
+    if cols['amount'] is None and cols['debit'] is None and cols['credit'] is None:
+        raise StatementError(f"No amount column found in: {', '.join(headers)}")
+    return cols
+
+# --- Readers ---
+# Each yields DataFrames of raw text with Date, Description and Amount columns
+# (or Debit/Credit instead of Amount) plus a ready-made 'Parsed' date column for OFX.
+
+def read_csv_chunks(path, chunk_size=CHUNK_ROWS, columns=None):
+    headers = list(pd.read_csv(path, nrows=0, encoding='utf-8-sig', encoding_errors='replace').columns)
+    cols = columns or map_columns(headers)
+    rename = {v: k for k, v in cols.items() if v is not None}
+    reader = pd.read_csv(path, chunksize=chunk_size, usecols=list(rename), dtype=str,
+                         encoding='utf-8-sig', encoding_errors='replace', skipinitialspace=True)
+    for chunk in reader:
+        yield chunk.rename(columns=rename)
+
+OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.DOTALL)
+OFX_FIELD = re.compile(r'<(DTPOSTED|TRNAMT|NAME|MEMO)>([^<\r\n]*)')
+OFX_DATE_FORMAT = '%Y%m%d%H%M%S'
+
+def read_ofx_chunks(path, chunk_size=CHUNK_ROWS, columns=None):
+    """OFX (SGML or XML flavour) read a block at a time; only whole <STMTTRN> records are parsed."""
+    rows = {'date': [], 'description': [], 'amount': []}
+    buffer = ''
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        while True:
+            block = f.read(OFX_READ_CHARS)
+            buffer += block
+            end = 0
+            for match in OFX_TRANSACTION.finditer(buffer):
+                fields = {k: v.strip() for k, v in OFX_FIELD.findall(match.group(1))}
+                rows['date'].append(fields.get('DTPOSTED'))
+                rows['description'].append(fields.get('NAME') or fields.get('MEMO'))
+                rows['amount'].append(fields.get('TRNAMT'))
+                end = match.end()
+            # Keep only a record that's still open (or what might be the start of its tag)
+            start = buffer.find('<STMTTRN>', end)
+            buffer = buffer[start:] if start >= 0 else buffer[-len('<STMTTRN>'):]
+            if len(rows['date']) >= chunk_size or (not block and rows['date']):
+                chunk = pd.DataFrame(rows, dtype=str)
+                # DTPOSTED is YYYYMMDD with an optional HHMMSS[.XXX][TZ] tail
+                parsed = pd.to_datetime(chunk['date'].str.slice(0, 14), format=OFX_DATE_FORMAT, errors='coerce')
+                short = parsed.isna()
+                if short.any(): parsed[short] = pd.to_datetime(chunk['date'][short].str.slice(0, 8), format='%Y%m%d', errors='coerce')
+                chunk['Parsed'] = parsed
+                yield chunk
+                rows = {'date': [], 'description': [], 'amount': []}
+            if not block: break
+
+READERS = {'csv': read_csv_chunks, 'ofx': read_ofx_chunks}
+
+# --- Deduplication ---
+
+def row_keys(dates, descs, amounts):
+    """64-bit hash per (date to the second, description, amount in cents) row."""
+    frame = pd.DataFrame({
+        'Date': np.asarray(dates, dtype='datetime64[s]').view(np.int64),
+        'Description': pd.Categorical(descs), # Hashes like the plain strings, but only once per distinct one
+        'Amount': to_minor(amounts),
+    })
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+class DedupeIndex:
+    """
+    Sorted hashes of the rows already in the ledger, with how many copies of each there are.
+    A row counts as a duplicate while there's an unmatched copy left, so importing the same
+    statement twice adds nothing, while two identical coffees on one day in a new statement both stay.
+    """
+    def __init__(self, static):
+        if static is None or static.empty:
+            self.keys = np.array([], dtype=np.uint64)
+            self.remaining = np.array([], dtype=np.int64)
+        else:
+            keys = row_keys(static['Date'].to_numpy(dtype='datetime64[ns]'), static['Description'], static['Amount'])
+            self.keys, self.remaining = np.unique(keys, return_counts=True)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def new_rows(self, keys):
+        """Mask of the keys not matched by an existing row. Matched copies are used up."""
+        new = np.ones(len(keys), dtype=bool)
+        if not len(self.keys) or not len(keys): return new
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        hit = np.flatnonzero(self.keys[pos] == keys)
+        if not len(hit): return new
+        slots = pos[hit]
+        # The k-th occurrence of a key in this chunk matches if at least k + 1 copies are left
+        rank = pd.Series(slots).groupby(slots).cumcount().to_numpy()
+        dup = rank < self.remaining[slots]
+        new[hit[dup]] = False
+        np.subtract.at(self.remaining, slots[dup], 1)
+        return new
+
+# --- Pipeline ---
+
+def prepare_import(path, static, fmt=None, date_format=None, chunk_size=CHUNK_ROWS, columns=None, progress=None, write=None):
+    """
+    Runs a statement file through parsing and deduplication against static (the ledger's
+    current history) without writing anything. Returns (rows, stats): rows is a frame
+    ready for Ledger.save_static_rows. progress(stats) is called after every chunk.
+    If write is given, each chunk's new rows go to write(frame) instead of being kept,
+    and rows comes back empty.
+    """
+    fmt = fmt or detect_format(path)
+    t0 = time.perf_counter()
+    index = DedupeIndex(static)
+    stats = {'file': path, 'format': fmt, 'date_format': date_format, 'rows_read': 0, 'imported': 0,
+             'duplicates': 0, 'skipped': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+    dates, descs, amounts = [], [], []
+
+    for chunk in READERS[fmt](path, chunk_size, columns):
+        with perf.span('import chunk') as s:
+            if 'Parsed' in chunk.columns:
+                parsed = chunk['Parsed'].to_numpy(dtype='datetime64[ns]')
+                stats['date_format'] = OFX_DATE_FORMAT
+            else:
+                if stats['date_format'] is None: stats['date_format'] = detect_date_format(chunk['date'])
+                parsed = parse_dates(chunk['date'], stats['date_format'])
+
+            if 'amount' in chunk.columns:
+                amount = clean_amounts(chunk['amount'])
+            else:
+                # Separate columns: money in minus money out, whichever sign the bank gave the debit
+                credit = clean_amounts(chunk['credit']) if 'credit' in chunk.columns else pd.Series(np.nan, index=chunk.index)
+                debit = clean_amounts(chunk['debit']) if 'debit' in chunk.columns else pd.Series(np.nan, index=chunk.index)
+                amount = credit.fillna(0) - debit.abs().fillna(0)
+                amount[credit.isna() & debit.isna()] = np.nan
+
+            if 'description' in chunk.columns: desc = clean_descriptions(chunk['description'])
+            else: desc = np.full(len(chunk), DEFAULT_DESCRIPTION, dtype=object)
+
+            valid = ~np.isnat(parsed) & amount.notna().to_numpy()
+            chunk_dates = parsed[valid]
+            chunk_amounts = np.round(amount.to_numpy(dtype=np.float64)[valid], 2)
+            chunk_descs = desc[valid]
+
+            keep = index.new_rows(row_keys(chunk_dates, chunk_descs, chunk_amounts))
+            if write is not None:
+                write(pd.DataFrame({'Date': chunk_dates[keep], 'Description': pd.Categorical(chunk_descs[keep]), 'Amount': chunk_amounts[keep]}))
+            else:
+                dates.append(chunk_dates[keep])
+                amounts.append(chunk_amounts[keep])
+                descs.append(pd.Categorical(chunk_descs[keep]))
+
+            stats['rows_read'] += len(chunk)
+            stats['skipped'] += int(len(chunk) - valid.sum())
+            stats['duplicates'] += int(len(keep) - keep.sum())
+            stats['imported'] += int(keep.sum())
+            s.count(len(chunk))
+        stats['seconds'] = time.perf_counter() - t0
+        stats['rows_per_sec'] = stats['rows_read'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+        if progress is not None: progress(dict(stats))
+
+    rows = pd.DataFrame({
+        'Date': np.concatenate(dates) if dates else np.array([], dtype='datetime64[ns]'),
+        'Description': union_categoricals(descs) if descs else pd.Categorical([]),
+        'Amount': np.concatenate(amounts) if amounts else np.array([], dtype=np.float64),
+    })
+    stats['seconds'] = time.perf_counter() - t0
+    stats['rows_per_sec'] = stats['rows_read'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    return rows, stats
+
+def import_statement(ledger, path, dry_run=False, **options):
+    """
+    prepare_import against the ledger's history, appending each chunk's new rows to disk as it goes.
+    Returns the stats. If it fails part way, the chunks before stay imported; running it again skips them as duplicates.
+    """
+    static, _ = ledger.load()
+    write_seconds = 0.0
+
+    def write(rows):
+        nonlocal write_seconds
+        if dry_run or rows.empty: return
+        t0 = time.perf_counter()
+        ledger.stream_static_rows(rows['Date'], rows['Description'], rows['Amount'])
+        write_seconds += time.perf_counter() - t0
+
+    _, stats = prepare_import(path, static, write=write, **options)
+    if not dry_run: stats['write_seconds'] = write_seconds
+    return stats
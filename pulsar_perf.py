@@ -0,0 +1,112 @@
+"""
+Lightweight timing spans for Pulsar's hot paths.
+
+    with perf.span('sort') as s:
+        ...
+        s.count(len(frame))
+
+Spans only measure anything while collection is on. When it's off, span() hands
+back one shared do-nothing object, so instrumented code pays a function call.
+Collection starts at launch if PULSAR_PERF is set: to 1 to keep stats in memory
+(for the diagnostics window), or to a file path to also log every span there.
+"""
+import os
+import threading
+import time
+from collections import deque, OrderedDict
+from datetime import datetime
+
+# --- Configuration ---
+WINDOW = 200 # Samples kept per stage for the rolling percentiles
+
+# --- Collection ---
+
+enabled = False
+log_file = None
+_lock = threading.Lock()
+_samples = OrderedDict() # stage -> deque of (seconds, rows), in the order stages were first seen
+
+class _NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def count(self, rows): pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    __slots__ = ('stage', 'rows', 't0')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.rows = None
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Cancelled or failed work isn't a timing sample
+        if exc_type is None: record(self.stage, time.perf_counter() - self.t0, self.rows)
+        return False
+
+    def count(self, rows):
+        self.rows = rows
+
+def span(stage):
+    """Times the with-block as one sample of stage."""
+    if not enabled: return NULL_SPAN
+    return Span(stage)
+
+def record(stage, seconds, rows=None):
+    """Adds a sample that was timed elsewhere (e.g. the main loop latency probe)."""
+    if not enabled: return
+    with _lock:
+        samples = _samples.get(stage)
+        if samples is None: samples = _samples[stage] = deque(maxlen=WINDOW)
+        samples.append((seconds, rows))
+        if log_file is not None:
+            p50, p95 = _percentiles([s for s, _ in samples])
+            line = f"{datetime.now():%H:%M:%S.%f}"[:-3] + f"  {stage:<22}{seconds * 1000:9.2f} ms  p50 {p50 * 1000:8.2f}  p95 {p95 * 1000:8.2f}"
+            if rows is not None: line += f"  rows {rows}"
+            try: log_file.write(line + "\n")
+            except: pass
+
+def _percentiles(values):
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    return ordered[round(0.50 * last)], ordered[round(0.95 * last)]
+
+def stats():
+    """Per stage: sample count, last/p50/p95/max seconds and the rows of the last sample."""
+    with _lock:
+        snapshot = [(stage, list(samples)) for stage, samples in _samples.items()]
+    rows = []
+    for stage, samples in snapshot:
+        if not samples: continue
+        seconds = [s for s, _ in samples]
+        p50, p95 = _percentiles(seconds)
+        rows.append({'stage': stage, 'count': len(samples), 'last': seconds[-1], 'p50': p50, 'p95': p95,
+                     'max': max(seconds), 'rows': samples[-1][1]})
+    return rows
+
+def reset():
+    with _lock: _samples.clear()
+
+def enable(log_path=None):
+    global enabled, log_file
+    if log_path and log_file is None:
+        try: log_file = open(log_path, 'a', encoding='utf-8', buffering=1)
+        except: log_file = None
+    enabled = True
+
+def disable():
+    global enabled, log_file
+    enabled = False
+    if log_file is not None:
+        try: log_file.close()
+        except: pass
+        log_file = None
+
+_setting = os.environ.get('PULSAR_PERF')
+if _setting:
+    enable(None if _setting.lower() in ('1', 'true', 'yes') else _setting)